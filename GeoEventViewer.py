@@ -1,17 +1,32 @@
 import sys
 import requests
-import sqlite3
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+import csv
+import json
+import os
+import re
+import hashlib
 import random
+import queue
+import threading
+import sqlite3
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+import argparse
 import time
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QLabel, QMainWindow, QScrollArea, QFrame, 
+                             QLabel, QMainWindow, QScrollArea, QListView,
+                             QAbstractItemView, QStyledItemDelegate, QStyle,
                              QPushButton, QCalendarWidget, QDialog)
-from PyQt5.QtCore import Qt, QTimer, QEvent, pyqtSignal
-from PyQt5.QtGui import QCursor, QIcon
+from PyQt5.QtCore import (Qt, QTimer, QEvent, QObject, pyqtSignal, QAbstractListModel,
+                          QModelIndex, QSize, QRectF, QPoint, QElapsedTimer)
+from PyQt5.QtGui import QCursor, QIcon, QFont, QFontMetrics, QPainter, QPen, QColor
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 import resources_rc
+from banco import DBManager, EscritorLote, LeitorDB, MS_DIA
 
 # Tente importar winsound (apenas Windows), senão ignora
 try:
@@ -24,55 +39,47 @@ VERSAO = "GEO EVENT VIEWER"
 USER_AGENT = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) GeoViewer/5.1"}
 # Tempo para considerar um evento como "AGORA" (em milissegundos) -> 40 minutos
 TEMPO_RECENTE_MS = 40 * 60 * 1000 
-
-# --- GERENCIADOR DE BANCO DE DADOS ---
-class DBManager:
-    def __init__(self):
-        self.conn = sqlite3.connect("historico_v5.db")
-        self.create_table()
-
-    def create_table(self):
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS eventos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ts REAL, 
-                tipo_orig TEXT, 
-                loc TEXT, 
-                lat REAL, lon REAL, 
-                categoria TEXT,
-                escala_tecnica TEXT,
-                tipo_impacto TEXT,
-                nivel_impacto TEXT,
-                risco_vitimas TEXT,
-                hora TEXT, data TEXT,
-                UNIQUE(ts, loc)
-            )
-        """)
-        self.conn.commit()
-
-    def salvar_evento(self, ev):
-        data_str = datetime.now().strftime("%Y-%m-%d")
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT OR IGNORE INTO eventos 
-                (ts, tipo_orig, loc, lat, lon, categoria, escala_tecnica, tipo_impacto, nivel_impacto, risco_vitimas, hora, data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (ev.ts, ev.titulo, ev.loc, ev.lat, ev.lon, ev.categoria, ev.escala, ev.impacto_tipo, ev.impacto_nivel, ev.risco_vitimas, ev.hora, data_str))
-            self.conn.commit()
-        except Exception as e:
-            print(f"Erro BD: {e}")
-
-    def buscar_historico(self, cat, data):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM eventos WHERE categoria = ? AND data = ? ORDER BY ts DESC", (cat, data))
-        return cursor.fetchall()
+# Downloads simultâneos no pool de coleta
+MAX_DOWNLOADS = 4
+# Cache HTTP persistente (ETag / Last-Modified / hash do corpo)
+DIR_CACHE_HTTP = "cache_http"
+# Feed resumido da USGS: all_hour, all_day, all_week ou all_month; formato geojson ou csv
+# (o CSV não traz a flag "tsunami": com os serviços de sismo/tsunami a fonte fica em geojson)
+FEED_USGS = "all_hour"
+FORMATO_USGS = "geojson"
+# Tamanho dos blocos lidos da rede/disco pelos parsers em streaming
+BLOCO_STREAM = 64 * 1024
+# Retentativas com backoff exponencial + jitter (segundos)
+TENTATIVAS_HTTP = 3
+BACKOFF_BASE_S = 0.5
+# Circuit breaker: após N falhas seguidas o host fica bloqueado por X segundos
+FALHAS_ABRIR_CIRCUITO = 3
+CIRCUITO_ABERTO_S = 300
+# Magnitude a partir da qual um novo evento leva a fonte ao intervalo mínimo
+MAG_CRISE = 5.0
+# Backfill histórico pela API FDSN da USGS
+URL_FDSN = "https://earthquake.usgs.gov/fdsnws/event/1/query"
+LIMITE_FDSN = 20000  # máximo de eventos por consulta aceito pelo serviço
+BACKFILL_JANELA_DIAS = 7
+BACKFILL_WORKERS = 4
+BACKFILL_REQ_POR_S = 2.0
+# Histórico exibido em volta do evento no mapa (busca no índice espacial)
+RAIO_VIZINHOS_KM = 500
+MAX_VIZINHOS = 500
+# Período (antes e depois do evento) coberto por essa busca: poucos shards mensais anexados
+JANELA_VIZINHOS_DIAS = 90
+# Janelas de mapa mantidas vivas e reaproveitadas (cada uma com o seu QWebEngineView)
+MAX_JANELAS_MAPA = 2
+# Cor de cada categoria nos tiles do menu
+CORES_CATEGORIA = {"sismo": "#61afef", "tsunami": "#98c379", "vulcao": "#e06c75", "clima": "#c678dd", "solar": "#e5c07b"}
+# Lotes que chegam juntos são aplicados à lista numa única atualização (no máximo uma por intervalo)
+INTERVALO_LISTA_MS = 250
 
 # --- MODELO DE DADOS ---
 class EventoData:
     def __init__(self, ts, categoria, titulo, loc, lat, lon, cor, 
-                 escala_tecnica, impacto_tipo, impacto_nivel, risco_vitimas):
+                 escala_tecnica, impacto_tipo, impacto_nivel, risco_vitimas, mag=None, atualizado=None, uid=None,
+                 prof_km=None):
         self.ts = ts
         self.categoria = categoria
         self.titulo = titulo
@@ -86,10 +93,312 @@ class EventoData:
         self.impacto_tipo = impacto_tipo
         self.impacto_nivel = impacto_nivel
         self.risco_vitimas = risco_vitimas
+        # Magnitude numérica (apenas fontes sísmicas)
+        self.mag = float(mag) if mag is not None else None
+        # Profundidade do hipocentro em km (USGS: terceira coordenada)
+        self.prof_km = float(prof_km) if prof_km is not None else None
+        # Momento da última revisão na origem (USGS "updated"); sem revisão, o próprio ts
+        self.atualizado = atualizado if atualizado is not None else ts
+        # Identidade estável: id da USGS, GUID do RSS ou, nas fontes simuladas,
+        # hash do conteúdo com a data do evento (o mesmo registro no mesmo dia)
+        if uid is None:
+            dia = datetime.fromtimestamp(ts/1000).strftime("%Y-%m-%d")
+            chave = f"{categoria}|{titulo}|{loc}|{escala_tecnica}|{dia}"
+            uid = "sim:" + hashlib.sha1(chave.encode("utf-8")).hexdigest()
+        self.uid = uid
+
+# --- CLIENTE HTTP ---
+# Sessão única com pool de conexões keep-alive, retentativas limitadas com
+# backoff e jitter dentro do prazo de cada fonte, e um circuit breaker por host
+# para que um endpoint lento não consuma o ciclo inteiro.
+
+class CircuitoAberto(Exception):
+    pass
+
+class ClienteHTTP:
+    def __init__(self):
+        self.sessao = requests.Session()
+        self.sessao.headers.update(USER_AGENT)
+        adaptador = HTTPAdapter(pool_connections=MAX_DOWNLOADS, pool_maxsize=MAX_DOWNLOADS, max_retries=0)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def _host(self, host):
+        return self.hosts.setdefault(host, {"requisicoes": 0, "falhas": 0, "retentativas": 0,
+                                            "falhas_seguidas": 0, "aberto_ate": 0.0, "ultimo_erro": None})
+
+    def estatisticas(self):
+        with self.lock:
+            return {h: dict(e) for h, e in self.hosts.items()}
+
+    def get(self, url, headers=None, timeout=5, prazo=None, **kwargs):
+        host = urlsplit(url).netloc
+        limite = time.monotonic() + (prazo or timeout)
+        with self.lock:
+            estado = self._host(host)
+            if estado["aberto_ate"] > time.monotonic():
+                raise CircuitoAberto(f"{host}: circuito aberto após {estado['falhas_seguidas']} falhas")
+        erro = None
+        for tentativa in range(TENTATIVAS_HTTP):
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                with self.lock: estado["requisicoes"] += 1
+                r = self.sessao.get(url, headers=headers, timeout=min(timeout, restante), **kwargs)
+                if r.status_code < 400:
+                    with self.lock: estado["falhas_seguidas"] = 0
+                    return r
+                erro = requests.HTTPError(f"HTTP {r.status_code}", response=r)
+                # A resposta é fechada antes de levantar o erro: com stream=True a
+                # conexão só volta ao pool depois disso
+                r.close()
+                # 5xx e 429 são transitórios; os demais 4xx não mudam com nova tentativa
+                if r.status_code < 500 and r.status_code != 429:
+                    break
+            except requests.RequestException as e:
+                erro = e
+            if tentativa < TENTATIVAS_HTTP - 1:
+                with self.lock: estado["retentativas"] += 1
+                espera = random.uniform(0, BACKOFF_BASE_S * 2 ** tentativa)
+                time.sleep(max(0.0, min(espera, limite - time.monotonic())))
+        erro = erro or requests.Timeout(f"{host}: prazo de {prazo or timeout}s esgotado")
+        with self.lock:
+            estado["falhas"] += 1
+            estado["falhas_seguidas"] += 1
+            estado["ultimo_erro"] = str(erro)
+            if estado["falhas_seguidas"] >= FALHAS_ABRIR_CIRCUITO:
+                estado["aberto_ate"] = time.monotonic() + CIRCUITO_ABERTO_S
+        raise erro
+
+CLIENTE_HTTP = ClienteHTTP()
+
+# --- CACHE HTTP ---
+# Guarda em disco, por URL, o último corpo recebido e seus validadores. Permite
+# requisições condicionais (resposta 304 sem corpo) e descarta corpos cujo hash
+# não mudou, para que feeds inalterados não sejam decodificados de novo.
+
+# Sentinela devolvida por Fonte.baixar quando o documento não mudou
+INALTERADO = object()
+
+class CacheHTTP:
+    def __init__(self, diretorio=DIR_CACHE_HTTP):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, url, ext):
+        chave = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.diretorio, f"{chave}.{ext}")
+
+    def meta(self, url):
+        try:
+            with open(self._caminho(url, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def corpo(self, url):
+        # Caminho do corpo salvo: os parsers leem direto do disco, em streaming
+        return self._caminho(url, "body")
+
+    def cabecalhos(self, url):
+        meta = self.meta(url)
+        h = {"Accept-Encoding": "gzip"}
+        # Sem corpo salvo, um 304 não teria o que devolver
+        if not os.path.exists(self._caminho(url, "body")):
+            return h
+        if meta.get("etag"): h["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): h["If-Modified-Since"] = meta["last_modified"]
+        return h
+
+    def gravar(self, url, resposta):
+        # Copia o corpo para o disco em blocos, calculando o hash no caminho;
+        # retorna False se for idêntico ao já armazenado
+        destino = self._caminho(url, "body")
+        tmp = destino + ".tmp"
+        digest = hashlib.sha256()
+        with resposta, open(tmp, "wb") as f:
+            for bloco in resposta.iter_content(BLOCO_STREAM):
+                digest.update(bloco)
+                f.write(bloco)
+        digest = digest.hexdigest()
+        mudou = digest != self.meta(url).get("hash")
+        if mudou:
+            os.replace(tmp, destino)
+        else:
+            os.remove(tmp)
+        meta = {"url": url, "etag": resposta.headers.get("ETag"),
+                "last_modified": resposta.headers.get("Last-Modified"), "hash": digest}
+        self._gravar_atomico(self._caminho(url, "json"), json.dumps(meta).encode("utf-8"))
+        return mudou
+
+    @staticmethod
+    def _gravar_atomico(caminho, dados):
+        tmp = caminho + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(dados)
+        os.replace(tmp, caminho)
+
+# --- PARSERS EM STREAMING ---
+# Geram um item por vez a partir do arquivo em disco, sem materializar o
+# documento inteiro: o pico de memória independe do tamanho do feed.
+
+_SEPARADORES_JSON = re.compile(r"[\s,]*")
+# "features" como chave de objeto (não como valor de string nos metadados)
+_CHAVE_FEATURES = re.compile(r'"features"\s*:\s*\[')
+
+def iterar_features_geojson(caminho):
+    decoder = json.JSONDecoder()
+    with open(caminho, encoding="utf-8") as f:
+        buf = ""
+        # Avança até a abertura do array "features"
+        while True:
+            chunk = f.read(BLOCO_STREAM)
+            if not chunk:
+                raise ValueError("GeoJSON sem o array 'features'")
+            buf += chunk
+            m = _CHAVE_FEATURES.search(buf)
+            if m:
+                buf, pos = buf[m.end():], 0
+                break
+            # A chave pode estar com o ':' ou o '[' ainda no próximo bloco:
+            # preserva a partir da última ocorrência
+            i = buf.rfind('"features"')
+            buf = buf[i:] if i >= 0 else buf[-len('"features"'):]
+        # Decodifica uma feature por vez; o buffer só guarda o bloco corrente
+        while True:
+            pos = _SEPARADORES_JSON.match(buf, pos).end()
+            if buf.startswith("]", pos):
+                return
+            try:
+                feature, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(BLOCO_STREAM)
+                if not chunk:
+                    raise ValueError("GeoJSON truncado")
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield feature
+
+def iterar_itens_rss(caminho):
+    # iterparse entrega cada <item> completo; depois de consumido ele é limpo e
+    # removido do <channel>, então a árvore nunca cresce além de um item
+    canal = None
+    for evento, elem in ET.iterparse(caminho, events=("start", "end")):
+        if evento == "start":
+            if elem.tag == "channel":
+                canal = elem
+            continue
+        if elem.tag == "item":
+            yield elem
+            elem.clear()
+            if canal is not None:
+                canal.remove(elem)
+
+def _iso_para_ms(valor):
+    return datetime.fromisoformat(valor.replace("Z", "+00:00")).timestamp() * 1000
+
+def iterar_features_csv(caminho):
+    # O CSV da USGS traz as mesmas informações em colunas; cada linha vira uma
+    # feature no formato GeoJSON. Ele não tem a flag "tsunami" (fica None,
+    # desconhecida); os serviços que dependem dela só aceitam GeoJSON
+    with open(caminho, newline="", encoding="utf-8") as f:
+        for linha in csv.DictReader(f):
+            yield {
+                "id": linha["id"],
+                "properties": {
+                    "mag": float(linha["mag"]) if linha["mag"] else None,
+                    "place": linha["place"],
+                    "time": _iso_para_ms(linha["time"]),
+                    "updated": _iso_para_ms(linha["updated"]),
+                    "tsunami": None,
+                },
+                "geometry": {"coordinates": [float(linha["longitude"]), float(linha["latitude"]),
+                                             float(linha["depth"]) if linha["depth"] else None]},
+            }
+
+# --- FONTES (FEEDS COMPARTILHADOS) ---
+# Cada documento remoto é baixado e decodificado uma única vez por ciclo e
+# repassado a todos os serviços que o consomem (ex.: sismo e tsunami leem o
+# mesmo GeoJSON da USGS e enxergam o mesmo snapshot).
+
+class Fonte:
+    cache = None
+
+    def __init__(self, nome, url=None, formato=None, timeout=5, prazo=None,
+                 intervalo=60, intervalo_min=None, intervalo_max=None):
+        self.nome = nome
+        self.url = url
+        self.formato = formato
+        self.timeout = timeout
+        # Tempo total (todas as tentativas) que a fonte pode consumir do ciclo
+        self.prazo = prazo or timeout
+        # Intervalos de polling em segundos (base, mínimo em crise, máximo em calmaria)
+        self.intervalo = intervalo
+        self.intervalo_min = intervalo_min or intervalo
+        self.intervalo_max = intervalo_max or intervalo
+
+    def exigir(self, formatos):
+        # Um consumidor que depende de campos ausentes no formato configurado
+        # (ex.: a flag "tsunami", que o CSV da USGS não traz) mantém a fonte no
+        # primeiro formato que ele aceita
+        if self.url is None or self.formato in formatos:
+            return
+        novo = formatos[0]
+        print(f"Fonte {self.nome}: formato {self.formato} sem os campos exigidos; usando {novo}")
+        self.url = self.url[:-len(self.formato)] + novo
+        self.formato = novo
+
+    def baixar(self):
+        # Fontes simuladas não têm URL
+        if self.url is None:
+            return None
+        if Fonte.cache is None:
+            Fonte.cache = CacheHTTP()
+        r = CLIENTE_HTTP.get(self.url, headers=Fonte.cache.cabecalhos(self.url), timeout=self.timeout,
+                             prazo=self.prazo, stream=True)
+        if r.status_code == 304:
+            r.close()
+            return INALTERADO
+        # Códigos de erro já chegam como exceção do ClienteHTTP (falha do host).
+        # Devolve o caminho do corpo em disco; o parse é feito em streaming a partir dele
+        return Fonte.cache.corpo(self.url) if Fonte.cache.gravar(self.url, r) else INALTERADO
+
+    def corpo_em_cache(self):
+        return Fonte.cache.corpo(self.url)
+
+    def decodificar(self, caminho):
+        # Itens do documento, um por vez, para repasse aos consumidores
+        if self.url is None:
+            return [None]
+        if self.formato == "geojson":
+            return iterar_features_geojson(caminho)
+        if self.formato == "csv":
+            return iterar_features_csv(caminho)
+        if self.formato == "rss":
+            return iterar_itens_rss(caminho)
+        raise ValueError(f"Formato desconhecido: {self.formato}")
+
+FONTES = {
+    "usgs": Fonte("usgs", f"https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/{FEED_USGS}.{FORMATO_USGS}",
+                  FORMATO_USGS, timeout=5 if FEED_USGS in ("all_hour", "all_day") else 30, prazo=60,
+                  intervalo=60, intervalo_min=15, intervalo_max=300),
+    "vulcoes": Fonte("vulcoes", "https://volcano.si.edu/news/WeeklyVolcanoRSS.xml", "rss", timeout=8, prazo=15,
+                     intervalo=3600, intervalo_min=900, intervalo_max=6 * 3600),
+    "solar": Fonte("solar", intervalo=300, intervalo_max=1800),
+    "clima": Fonte("clima", intervalo=600, intervalo_max=3600),
+}
 
 # --- SERVIÇOS DE COLETA ---
 
 class SismoService:
+    CATEGORIA = "sismo"
+    FONTE = "usgs"
+    # Os alertas de tsunami saem desta lista pela flag, que só o GeoJSON traz
+    FORMATOS = ("geojson",)
+
     @staticmethod
     def analisar_risco(mag):
         mag = float(mag)
@@ -99,31 +408,31 @@ class SismoService:
         return "Richter " + str(mag), "Baixo", "Sem Risco"
 
     @staticmethod
-    def fetch():
-        items = []
-        try:
-            url = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
-            r = requests.get(url, headers=USER_AGENT, timeout=5).json()
-            for f in r['features']:
-                p, g = f['properties'], f['geometry']['coordinates']
-                if p['tsunami'] == 0:
-                    escala, nivel, risco = SismoService.analisar_risco(p['mag'])
-                    
-                    # Extração da Sigla/País (última parte após a vírgula)
-                    loc_full = p['place']
-                    pais = loc_full.split(',')[-1].strip() if ',' in loc_full else "Intl"
-                    # Padrão: PAÍS - TERREMOTO - Graus
-                    novo_titulo = f"{pais.upper()} - TERREMOTO - {p['mag']} Richter"
-                    
-                    items.append(EventoData(
-                        ts=p['time'], categoria="sismo", titulo=novo_titulo, loc=p['place'],
-                        lat=g[1], lon=g[0], cor="#61afef", escala_tecnica=escala,
-                        impacto_tipo="Terrestre / Estrutural", impacto_nivel=nivel, risco_vitimas=risco
-                    ))
-        except: pass
-        return items
+    def converter(f):
+        p, g = f['properties'], f['geometry']['coordinates']
+        if p['tsunami'] != 0:
+            return None
+        escala, nivel, risco = SismoService.analisar_risco(p['mag'])
+        
+        # Extração da Sigla/País (última parte após a vírgula)
+        loc_full = p['place']
+        pais = loc_full.split(',')[-1].strip() if ',' in loc_full else "Intl"
+        # Padrão: PAÍS - TERREMOTO - Graus
+        novo_titulo = f"{pais.upper()} - TERREMOTO - {p['mag']} Richter"
+        
+        return EventoData(
+            ts=p['time'], categoria="sismo", titulo=novo_titulo, loc=p['place'],
+            lat=g[1], lon=g[0], cor="#61afef", escala_tecnica=escala,
+            impacto_tipo="Terrestre / Estrutural", impacto_nivel=nivel, risco_vitimas=risco,
+            mag=p['mag'], atualizado=p.get('updated'), uid=f"usgs:{f['id']}",
+            prof_km=g[2] if len(g) > 2 else None
+        )
 
 class TsunamiService:
+    CATEGORIA = "tsunami"
+    FONTE = "usgs"
+    FORMATOS = ("geojson",)
+
     @staticmethod
     def analisar_risco(mag):
         m = float(mag)
@@ -131,363 +440,982 @@ class TsunamiService:
         return "Papadopoulos II-III", "Alto", "Médio Risco"
 
     @staticmethod
-    def fetch():
-        items = []
-        try:
-            url = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
-            r = requests.get(url, headers=USER_AGENT, timeout=5).json()
-            for f in r['features']:
-                if f['properties']['tsunami'] == 1:
-                    p, g = f['properties'], f['geometry']['coordinates']
-                    escala, nivel, risco = TsunamiService.analisar_risco(p['mag'])
-                    items.append(EventoData(
-                        ts=p['time'], categoria="tsunami", titulo="Alerta de Tsunami", loc=p['place'],
-                        lat=g[1], lon=g[0], cor="#98c379", # VERDE para Tsunami
-                        escala_tecnica=escala, impacto_tipo="Costeiro / Marítimo", 
-                        impacto_nivel=nivel, risco_vitimas=risco
-                    ))
-        except: pass
-        return items
+    def converter(f):
+        p, g = f['properties'], f['geometry']['coordinates']
+        if p['tsunami'] != 1:
+            return None
+        escala, nivel, risco = TsunamiService.analisar_risco(p['mag'])
+        return EventoData(
+            ts=p['time'], categoria="tsunami", titulo="Alerta de Tsunami", loc=p['place'],
+            lat=g[1], lon=g[0], cor="#98c379", # VERDE para Tsunami
+            escala_tecnica=escala, impacto_tipo="Costeiro / Marítimo", 
+            impacto_nivel=nivel, risco_vitimas=risco, mag=p['mag'],
+            atualizado=p.get('updated'), uid=f"usgs:{f['id']}", prof_km=g[2] if len(g) > 2 else None
+        )
 
 class VulcaoService:
+    CATEGORIA = "vulcao"
+    FONTE = "vulcoes"
+    NAMESPACES = {'georss': 'http://www.georss.org/georss'}
+    RE_TITULO = re.compile(r'(.*)\((.*)\)')
+    TERMOS_ALERTA = ("evacuation", "lava", "ash", "explosion")
+
     @staticmethod
-    def fetch():
-        items = []
-        try:
-            url = "https://volcano.si.edu/news/WeeklyVolcanoRSS.xml"
-            r = requests.get(url, headers=USER_AGENT, timeout=8)
-            namespaces = {'georss': 'http://www.georss.org/georss'}
-            root = ET.fromstring(r.content)
-            now_ts = datetime.now().timestamp() * 1000
-            
-            for item in root.findall('.//item')[:4]:
-                title_raw = item.find('title').text
-                desc = item.find('description').text
-                
-                import re
-                match = re.search(r'(.*)\((.*)\)', title_raw)
-                nome_vulcao, pais_vulcao = (match.group(1).strip(), match.group(2).strip()) if match else (title_raw, "Global")
-                novo_titulo = f"{pais_vulcao.upper()} - VULCÃO - {nome_vulcao}"
-                
-                geo = item.find('georss:point', namespaces)
-                lat, lon = (float(geo.text.split()[0]), float(geo.text.split()[1])) if geo is not None else (0.0, 0.0)
-                
-                nivel, risco = ("Alto", "Médio Risco") if any(x in desc.lower() for x in ["evacuation", "lava", "ash", "explosion"]) else ("Médio", "Baixo Risco")
-                
-                items.append(EventoData(
-                    ts=now_ts, categoria="vulcao", titulo=novo_titulo, loc=title_raw,
-                    lat=lat, lon=lon, cor="#e06c75", # VERMELHO para Vulcão
-                    escala_tecnica="Erupção Ativa", impacto_tipo="Atmosférico / Aéreo", 
-                    impacto_nivel=nivel, risco_vitimas=risco
-                ))
-                now_ts -= 1000
-        except: pass
-        return items
+    def converter(item):
+        title_raw = item.findtext('title')
+        desc = item.findtext('description') or ""
+        
+        match = VulcaoService.RE_TITULO.search(title_raw)
+        nome_vulcao, pais_vulcao = (match.group(1).strip(), match.group(2).strip()) if match else (title_raw, "Global")
+        novo_titulo = f"{pais_vulcao.upper()} - VULCÃO - {nome_vulcao}"
+        
+        geo = item.findtext('georss:point', namespaces=VulcaoService.NAMESPACES)
+        lat, lon = (float(geo.split()[0]), float(geo.split()[1])) if geo else (0.0, 0.0)
+        
+        desc = desc.lower()
+        nivel, risco = ("Alto", "Médio Risco") if any(x in desc for x in VulcaoService.TERMOS_ALERTA) else ("Médio", "Baixo Risco")
+        
+        # Data do boletim: o mesmo item mantém o mesmo ts entre ciclos
+        pub = item.findtext('pubDate')
+        ts = parsedate_to_datetime(pub).timestamp() * 1000 if pub else datetime.now().timestamp() * 1000
+        guid = item.findtext('guid') or item.findtext('link')
+        
+        return EventoData(
+            ts=ts, categoria="vulcao", titulo=novo_titulo, loc=title_raw,
+            lat=lat, lon=lon, cor="#e06c75", # VERMELHO para Vulcão
+            escala_tecnica="Erupção Ativa", impacto_tipo="Atmosférico / Aéreo", 
+            impacto_nivel=nivel, risco_vitimas=risco, uid=f"rss:{guid}" if guid else None
+        )
 
 class SolarService:
+    CATEGORIA = "solar"
+    FONTE = "solar"
+
     @staticmethod
-    def fetch():
+    def converter(item):
+        # Fonte simulada: item é sempre None
         now = datetime.now()
         # Simulação
         flares = [("B1", "Muito Baixo"), ("C3", "Baixo"), ("M1", "Médio"), ("X1", "Muito Alto")]
         f_sel = flares[1] 
         risco = "Sem Risco" if f_sel[0][0] in ['A','B','C'] else "Médio Risco"
-        return [EventoData(
+        # Uma leitura simulada por dia: revisão = início do dia, identidade = conteúdo + dia
+        inicio_dia = datetime.combine(now.date(), datetime.min.time()).timestamp()*1000
+        return EventoData(
             ts=now.timestamp()*1000, categoria="solar", titulo="Atividade Solar", loc="Ionosfera Global",
             lat=0.0, lon=0.0, cor="#e5c07b", escala_tecnica=f"Flare {f_sel[0]}",
-            impacto_tipo="Telecom / GPS", impacto_nivel=f_sel[1], risco_vitimas=risco
-        )]
+            impacto_tipo="Telecom / GPS", impacto_nivel=f_sel[1], risco_vitimas=risco,
+            atualizado=inicio_dia
+        )
 
 class ClimaService:
+    CATEGORIA = "clima"
+    FONTE = "clima"
+
     @staticmethod
-    def fetch():
+    def converter(item):
         # Simulador de Ciclones/Furacões (Geralmente dados de NHC/NOAA)
         now = datetime.now()
+        # Semente diária: a mesma tempestade simulada durante todo o dia
+        rng = random.Random(now.date().toordinal())
         nomes = ["Alberto", "Beryl", "Chris", "Debby", "Ernesto", "Francine", "Gordon", "Helene"]
-        nome_sel = random.choice(nomes)
-        vento = random.choice([120, 160, 200, 260])
+        nome_sel = rng.choice(nomes)
+        vento = rng.choice([120, 160, 200, 260])
         
         if vento > 252: escala, nivel, risco, cat = "Cat 5", "Muito Alto", "Alto Risco", "5"
         elif vento > 178: escala, nivel, risco, cat = "Cat 3", "Alto", "Médio Risco", "3"
         else: escala, nivel, risco, cat = "Cat 1", "Médio", "Baixo Risco", "1"
 
-        return [EventoData(
+        return EventoData(
             ts=now.timestamp()*1000, categoria="clima", 
             titulo=f"FURACÃO {nome_sel} (Cat {cat})", loc="Atlântico Norte / Caribe",
-            lat=random.uniform(15, 35), lon=random.uniform(-85, -45), cor="#c678dd", 
+            lat=rng.uniform(15, 35), lon=rng.uniform(-85, -45), cor="#c678dd", 
             escala_tecnica=f"Saffir-Simpson {escala} ({vento}km/h)",
-            impacto_tipo="Inundação / Ventos Fortes", impacto_nivel=nivel, risco_vitimas=risco
-        )]
+            impacto_tipo="Inundação / Ventos Fortes", impacto_nivel=nivel, risco_vitimas=risco,
+            atualizado=datetime.combine(now.date(), datetime.min.time()).timestamp()*1000
+        )
+
+def converter_itens(servicos, itens):
+    # Percorre o documento uma única vez repassando cada item a todos os
+    # consumidores; um item malformado descarta só ele, não o lote inteiro
+    resultado = {s.CATEGORIA: [] for s in servicos}
+    for item in itens:
+        for s in servicos:
+            try:
+                ev = s.converter(item)
+            except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+                print(f"Item {s.CATEGORIA} ignorado: {e!r}")
+                continue
+            if ev is not None:
+                resultado[s.CATEGORIA].append(ev)
+    return resultado
+
+# --- PIPELINE DE COLETA ---
+# Download (pool de threads) -> parse (thread dedicada) -> BD/alerta (thread dedicada).
+# Nada aqui roda na thread da GUI: o lote pronto chega à MainWindow via sinal Qt.
+
+class PipelineColeta(QObject):
+    # Lote de um ciclo: {categoria: [EventoData, ...]} e falhas {categoria: erro}
+    lote_pronto = pyqtSignal(dict, dict)
+    # Resultado por fonte para o agendador: "inalterado", "novos", "critico" ou "falha"
+    fonte_concluida = pyqtSignal(str, str)
+
+    def __init__(self, servicos):
+        super().__init__()
+        # Agrupa os serviços por fonte: cada fonte é baixada uma vez por ciclo
+        self.consumidores = {}
+        for s in servicos:
+            self.consumidores.setdefault(s.FONTE, []).append(s)
+            if hasattr(s, "FORMATOS"):
+                FONTES[s.FONTE].exigir(s.FORMATOS)
+        self.bip_ativo = False
+        # Último resultado por fonte, reaproveitado quando o feed não mudou
+        self.ultimos = {}
+        # Fontes com download/parse em curso (acessado pela GUI e pela thread de BD)
+        self.em_andamento = set()
+        self.lock = threading.Lock()
+        self.pool_download = ThreadPoolExecutor(max_workers=MAX_DOWNLOADS, thread_name_prefix="coleta")
+        self.fila_parse = queue.Queue()
+        self.fila_db = queue.Queue()
+        self.escritor = EscritorLote()
+        threading.Thread(target=self._estagio_parse, name="coleta-parse", daemon=True).start()
+        threading.Thread(target=self._estagio_db, name="coleta-db", daemon=True).start()
+
+    def disparar(self, nomes=None):
+        # Chamado pelo agendador: só agenda os downloads e retorna na hora
+        with self.lock:
+            # Fontes ainda aguardando a rede ficam de fora deste ciclo
+            nomes = [n for n in (nomes or self.consumidores) if n not in self.em_andamento]
+            self.em_andamento.update(nomes)
+        if not nomes:
+            return
+        ciclo = {"pendentes": len(nomes), "fontes": nomes, "lote": {}, "alteradas": set(), "falhas": {}}
+        for nome in nomes:
+            fonte = FONTES[nome]
+            futuro = self.pool_download.submit(fonte.baixar)
+            futuro.add_done_callback(lambda f, fonte=fonte: self.fila_parse.put((ciclo, fonte, f)))
+
+    def fonte_de(self, categoria):
+        return next(nome for nome, servicos in self.consumidores.items()
+                    if any(s.CATEGORIA == categoria for s in servicos))
+
+    def encerrar(self):
+        self.pool_download.shutdown(wait=False, cancel_futures=True)
+        self.escritor.encerrar()
+
+    def _estagio_parse(self):
+        while True:
+            ciclo, fonte, futuro = self.fila_parse.get()
+            try:
+                bruto = futuro.result()
+                if bruto is INALTERADO and fonte.nome in self.ultimos:
+                    # Feed inalterado: nenhum trabalho de parse
+                    ciclo["lote"].update(self.ultimos[fonte.nome])
+                    bruto = None
+                elif bruto is INALTERADO:
+                    # 304 logo após reiniciar: decodifica o corpo salvo em disco
+                    bruto = fonte.corpo_em_cache()
+                if bruto is not None or fonte.url is None:
+                    # Um único documento, lido uma vez, é repassado a todos os consumidores
+                    resultado = converter_itens(self.consumidores[fonte.nome], fonte.decodificar(bruto))
+                    self.ultimos[fonte.nome] = resultado
+                    ciclo["lote"].update(resultado)
+                    ciclo["alteradas"].update(resultado)
+            except Exception as e:
+                # Falha contada e exposta; a lista mantém o último resultado válido
+                print(f"Erro coleta {fonte.nome}: {e}")
+                anteriores = self.ultimos.get(fonte.nome, {})
+                for s in self.consumidores[fonte.nome]:
+                    ciclo["lote"][s.CATEGORIA] = anteriores.get(s.CATEGORIA, [])
+                    ciclo["falhas"][s.CATEGORIA] = str(e)
+            ciclo["pendentes"] -= 1
+            if ciclo["pendentes"] == 0:
+                self.fila_db.put(ciclo)
+
+    def _estagio_db(self):
+        # Marcas d'água persistidas: reiniciar o app não repete alertas nem gravações
+        leitor = LeitorDB()
+        marcas = leitor.carregar_marcas()
+        leitor.conn.close()
+        while True:
+            ciclo = self.fila_db.get()
+            lote, falhas = ciclo["lote"], ciclo["falhas"]
+            som_tocar = False
+            estados = {}
+            pendentes_ciclo, marcas_ciclo = [], {}
+            for nome in ciclo["fontes"]:
+                estado = "inalterado"
+                for s in self.consumidores[nome]:
+                    cat = s.CATEGORIA
+                    if cat in falhas:
+                        estado = "falha"; continue
+                    if cat not in ciclo["alteradas"]:
+                        continue
+                    ts_max, atualizado_max = marcas.get(cat, (0, 0))
+                    # Só o que é novo ou foi revisado na origem desde a última ingestão
+                    pendentes = [d for d in lote[cat] if d.atualizado > atualizado_max]
+                    if not pendentes:
+                        continue
+                    for d in pendentes:
+                        if d.ts > ts_max:
+                            som_tocar = True
+                            if estado != "critico":
+                                estado = "critico" if (d.mag or 0) >= MAG_CRISE else "novos"
+                    marcas[cat] = marcas_ciclo[cat] = (max(ts_max, max(d.ts for d in pendentes)),
+                                                       max(atualizado_max, max(d.atualizado for d in pendentes)))
+                    pendentes_ciclo.extend(pendentes)
+                estados[nome] = estado
+            # A gravação fica com o escritor em segundo plano (group commit)
+            if pendentes_ciclo:
+                self.escritor.enfileirar(pendentes_ciclo, marcas_ciclo)
+            self.lote_pronto.emit(lote, falhas)
+            with self.lock:
+                self.em_andamento.difference_update(ciclo["fontes"])
+            for nome, estado in estados.items():
+                self.fonte_concluida.emit(nome, estado)
+            if som_tocar and self.bip_ativo and winsound: winsound.Beep(1200, 300)
+
+# --- BACKFILL HISTÓRICO (FDSN) ---
+# Divide o período em janelas de tempo baixadas em paralelo (sob limite de
+# requisições por segundo) e grava cada janela numa única transação junto com
+# o seu status em backfill_janelas, de modo que uma execução interrompida
+# retoma exatamente das janelas pendentes.
+
+class LimitadorTaxa:
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo
+        self.proximo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        with self.lock:
+            agora = time.monotonic()
+            espera = self.proximo - agora
+            self.proximo = max(agora, self.proximo) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+class Backfill:
+    def __init__(self, db, inicio, fim, url=URL_FDSN, janela_dias=BACKFILL_JANELA_DIAS,
+                 workers=BACKFILL_WORKERS, req_por_s=BACKFILL_REQ_POR_S):
+        self.db = db
+        self.inicio, self.fim = inicio, fim
+        self.url = url
+        self.janela = timedelta(days=janela_dias)
+        self.workers = workers
+        self.limitador = LimitadorTaxa(req_por_s)
+        self.db.conn.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_janelas (
+                inicio TEXT, fim TEXT,
+                status TEXT DEFAULT 'pendente',
+                eventos INTEGER DEFAULT 0,
+                PRIMARY KEY (inicio, fim)
+            )
+        """)
+        self.db.conn.commit()
+
+    def _registrar_janelas(self):
+        janelas = []
+        a = self.inicio
+        while a < self.fim:
+            b = min(a + self.janela, self.fim)
+            janelas.append((a.isoformat(), b.isoformat()))
+            a = b
+        # Trechos já cobertos (inclusive janelas subdivididas numa execução anterior)
+        # são descontados: só as partes ainda descobertas de cada janela são inseridas
+        cobertos = [(datetime.fromisoformat(a), datetime.fromisoformat(b)) for a, b in self.db.conn.execute(
+            "SELECT inicio, fim FROM backfill_janelas WHERE inicio < ? AND fim > ? ORDER BY inicio",
+            (self.fim.isoformat(), self.inicio.isoformat()))]
+        novas = []
+        for a, b in janelas:
+            a, b = datetime.fromisoformat(a), datetime.fromisoformat(b)
+            for x, y in cobertos:
+                if y <= a or x >= b:
+                    continue
+                if x > a:
+                    novas.append((a.isoformat(), x.isoformat()))
+                a = max(a, y)
+                if a >= b:
+                    break
+            if a < b:
+                novas.append((a.isoformat(), b.isoformat()))
+        with self.db.conn:
+            self.db.conn.executemany("INSERT OR IGNORE INTO backfill_janelas (inicio, fim) VALUES (?, ?)", novas)
+        # Pendências que apenas tocam o intervalo (de execuções mais largas) também são retomadas
+        cursor = self.db.conn.execute(
+            "SELECT inicio, fim FROM backfill_janelas WHERE status != 'ok' AND inicio < ? AND fim > ? ORDER BY inicio",
+            (self.fim.isoformat(), self.inicio.isoformat()))
+        return cursor.fetchall()
+
+    def _baixar(self, inicio, fim):
+        self.limitador.aguardar()
+        params = {"format": "geojson", "starttime": inicio, "endtime": fim,
+                  "orderby": "time-asc", "limit": LIMITE_FDSN}
+        r = CLIENTE_HTTP.get(self.url, params=params, timeout=60, prazo=180)
+        # 204: nenhum evento na janela
+        if r.status_code == 204:
+            return []
+        r.raise_for_status()
+        return r.json()['features']
+
+    def executar(self):
+        pendentes = self._registrar_janelas()
+        total = 0
+        self.falhas = 0
+        print(f"Backfill: {len(pendentes)} janela(s) pendente(s)")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as pool:
+            futuros = {pool.submit(self._baixar, a, b): (a, b) for a, b in pendentes}
+            while futuros:
+                futuro = next(as_completed(futuros))
+                a, b = futuros.pop(futuro)
+                try:
+                    features = futuro.result()
+                except Exception as e:
+                    print(f"Janela {a} -> {b} falhou (fica pendente): {e}")
+                    self.falhas += 1
+                    continue
+                if len(features) >= LIMITE_FDSN:
+                    # Janela cheia demais: substitui por duas metades
+                    meio = (datetime.fromisoformat(a) + (datetime.fromisoformat(b) - datetime.fromisoformat(a)) / 2).isoformat()
+                    with self.db.conn:
+                        self.db.conn.execute("DELETE FROM backfill_janelas WHERE inicio = ? AND fim = ?", (a, b))
+                        self.db.conn.executemany("INSERT OR IGNORE INTO backfill_janelas (inicio, fim) VALUES (?, ?)", [(a, meio), (meio, b)])
+                    for x, y in ((a, meio), (meio, b)):
+                        futuros[pool.submit(self._baixar, x, y)] = (x, y)
+                    continue
+                lote = converter_itens([SismoService, TsunamiService], features)
+                eventos = lote["sismo"] + lote["tsunami"]
+                try:
+                    self.db.salvar_lote(eventos, extra=(
+                        "UPDATE backfill_janelas SET status = 'ok', eventos = ? WHERE inicio = ? AND fim = ?",
+                        (len(eventos), a, b)))
+                except sqlite3.Error as e:
+                    # Ex.: lock ocupado além do busy_timeout; a janela segue pendente
+                    print(f"Janela {a} -> {b} não gravada (fica pendente): {e}")
+                    self.falhas += 1
+                    continue
+                total += len(eventos)
+                print(f"Janela {a} -> {b}: {len(eventos)} evento(s)")
+        print(f"Backfill concluído: {total} evento(s) gravado(s), {self.falhas} janela(s) com falha")
+        return total
+
+# --- AGENDADOR ADAPTATIVO ---
+# Um QTimer de disparo único por fonte. O intervalo dobra enquanto o feed não
+# muda (até intervalo_max), volta a encurtar quando chegam eventos novos e vai
+# direto ao intervalo_min diante de um evento de magnitude >= MAG_CRISE.
+
+class AgendadorFontes(QObject):
+    def __init__(self, pipeline):
+        super().__init__()
+        self.pipeline = pipeline
+        self.intervalos = {}
+        self.timers = {}
+        for nome in pipeline.consumidores:
+            self.intervalos[nome] = FONTES[nome].intervalo
+            t = QTimer(self); t.setSingleShot(True)
+            t.timeout.connect(lambda nome=nome: self.pipeline.disparar([nome]))
+            self.timers[nome] = t
+        pipeline.fonte_concluida.connect(self.reagendar)
+
+    def disparar_todas(self):
+        for t in self.timers.values(): t.stop()
+        self.pipeline.disparar()
+
+    def reagendar(self, nome, estado):
+        fonte, atual = FONTES[nome], self.intervalos[nome]
+        if estado == "critico":
+            novo = fonte.intervalo_min
+        elif estado == "novos":
+            novo = max(fonte.intervalo_min, min(atual, fonte.intervalo) / 2)
+        else:
+            # Inalterado ou falha: backoff exponencial
+            novo = min(fonte.intervalo_max, atual * 2)
+        self.intervalos[nome] = novo
+        self.timers[nome].start(int(novo * 1000))
 
 # --- UI COMPONENTS ---
 
-class EventoRow(QFrame):
-    # Sinal criado para passar o evento para a MainWindow abrir o mapa
-    clique_mapa = pyqtSignal(object)
+class RelogioAnimacao(QObject):
+    # Relógio único das animações (piscar de cards e tiles). Cada categoria
+    # alterna de fase no seu intervalo (dessincronizadas entre si); a cada tique
+    # os inscritos recebem só as categorias que trocaram de fase e respondem se
+    # ainda têm algo "acontecendo agora". Quando ninguém tem, o timer para até o
+    # próximo acordar()
+    TIQUE_MS = 200
+    INTERVALOS = {"sismo": 600, "tsunami": 400, "vulcao": 800, "clima": 1000, "solar": 1200}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.inscritos = []
+        self.fases = {cat: False for cat in self.INTERVALOS}
+        self.decorrido = QElapsedTimer()
+        self.decorrido.start()
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.TIQUE_MS)
+        self.timer.timeout.connect(self._tique)
+
+    def fase(self, cat):
+        return self.fases.get(cat, False)
+
+    def inscrever(self, funcao):
+        self.inscritos.append(funcao)
+
+    def acordar(self):
+        if not self.timer.isActive():
+            self.timer.start()
 
-    def __init__(self, evento, is_happening_now=False):
+    def _tique(self):
+        t = self.decorrido.elapsed()
+        trocadas = set()
+        for cat, intervalo in self.INTERVALOS.items():
+            fase = (t // intervalo) % 2 == 1
+            if fase != self.fases[cat]:
+                self.fases[cat] = fase
+                trocadas.add(cat)
+        ativos = [funcao(trocadas) for funcao in self.inscritos]
+        if not any(ativos):
+            self.timer.stop()
+
+# Lista de eventos em model/view: o modelo só guarda os EventoData e o delegate
+# pinta o card de cada linha visível (nenhum widget por evento)
+
+class EventosModel(QAbstractListModel):
+    def __init__(self):
         super().__init__()
-        self.evento = evento
-        self.is_blink_active = False
-        self.setObjectName("Card")
-        self.setFixedHeight(100)
-        self.setCursor(QCursor(Qt.PointingHandCursor))
-        self.installEventFilter(self)
-        
-        main_layout = QHBoxLayout(self)
-        
-        dot = QLabel("●")
-        dot.setStyleSheet(f"color: {evento.cor}; font-size: 24pt;")
-        main_layout.addWidget(dot)
-
-        c1 = QVBoxLayout()
-        lbl_tit = QLabel(f"{evento.titulo}")
-        lbl_tit.setStyleSheet(f"color: {evento.cor}; font-weight: bold; font-size: 12pt;")
-        lbl_loc = QLabel(f"📍 {evento.loc}")
-        lbl_loc.setStyleSheet("color: #abb2bf; font-size: 9pt;")
-        lbl_loc.setWordWrap(True)
-        c1.addWidget(lbl_tit); c1.addWidget(lbl_loc); main_layout.addLayout(c1, 3)
-
-        c2 = QVBoxLayout()
-        lbl_escala = QLabel(f"📐 {evento.escala}")
-        lbl_escala.setStyleSheet("color: #d19a66; font-weight: bold;")
-        lbl_imp_tipo = QLabel(f"Impacto: {evento.impacto_tipo}")
-        lbl_imp_tipo.setStyleSheet("color: #98c379; font-size: 8pt;")
-        c2.addWidget(lbl_escala); c2.addWidget(lbl_imp_tipo); main_layout.addLayout(c2, 3)
-
-        c3 = QVBoxLayout()
-        lbl_nivel = QLabel(f"Nível: {evento.impacto_nivel.upper()}")
-        lbl_nivel.setStyleSheet("color: white; font-weight: bold; font-size: 8pt;")
-        cor_risco = "#e06c75" if "Alto" in evento.risco_vitimas else "#98c379"
-        lbl_risco = QLabel(f"👥 {evento.risco_vitimas}")
-        lbl_risco.setStyleSheet(f"color: {cor_risco}; font-size: 8pt; font-weight: bold;")
-        lbl_hora = QLabel(evento.hora)
-        lbl_hora.setStyleSheet("color: #5c6370; font-size: 14pt; font-weight: bold;")
-        
-        c3.addWidget(lbl_nivel); c3.addWidget(lbl_risco); c3.addWidget(lbl_hora, 0, Qt.AlignRight)
-        main_layout.addLayout(c3, 2)
-        
-        self.set_style(False)
-
-        # Lógica de Piscar: Só inicia se estiver acontecendo "agora" (is_happening_now)
-        if is_happening_now:
-            self.blink_timer = QTimer(self)
-            self.blink_timer.timeout.connect(self.toggle_blink)
-            # Frequência dessincronizada
-            intervals = {"sismo": 600, "tsunami": 400, "vulcao": 800, "clima": 1000, "solar": 1200}
-            self.blink_timer.start(intervals.get(evento.categoria, 700))
-
-    def set_style(self, hover):
-        bg = "#2c313a" if hover else "#21252b"
-        border_color = self.evento.cor if hover else "#181a1f"
-        self.setStyleSheet(f"QFrame#Card {{ background-color: {bg}; border: 1px solid {border_color}; border-radius: 6px; }}")
-
-    def toggle_blink(self):
-        if not self.underMouse():
-            self.is_blink_active = not self.is_blink_active
-            if self.is_blink_active:
-                self.setStyleSheet(f"QFrame#Card {{ background-color: #282c34; border: 2px solid {self.evento.cor}; }}")
+        self.eventos = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.eventos)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        ev = self.eventos[index.row()]
+        if role == Qt.UserRole: return ev
+        if role == Qt.DisplayRole: return ev.titulo
+        if role == Qt.ToolTipRole: return ev.loc
+        return None
+
+    def definir(self, eventos):
+        self.beginResetModel()
+        self.eventos = list(eventos)
+        self.endResetModel()
+
+    def linha(self, uid):
+        return next((i for i, ev in enumerate(self.eventos) if ev.uid == uid), None)
+
+    def sincronizar(self, eventos):
+        # Aplica a nova lista (mesma ordem da atual, sem uids repetidos) como
+        # diferença pela identidade do evento: remove os que saíram, troca no
+        # lugar os revisados e insere os novos. Um evento cujo ts mudou sai e
+        # volta na posição nova. Nada é emitido para o que não mudou
+        novos = {ev.uid: ev for ev in eventos}
+        def sai(ev):
+            novo = novos.get(ev.uid)
+            return novo is None or novo.ts != ev.ts
+        fim = len(self.eventos) - 1
+        while fim >= 0:
+            if not sai(self.eventos[fim]):
+                fim -= 1
+                continue
+            inicio = fim
+            while inicio > 0 and sai(self.eventos[inicio - 1]):
+                inicio -= 1
+            self.beginRemoveRows(QModelIndex(), inicio, fim)
+            del self.eventos[inicio:fim + 1]
+            self.endRemoveRows()
+            fim = inicio - 1
+        for i, ev in enumerate(self.eventos):
+            novo = novos[ev.uid]
+            if novo is not ev:
+                self.eventos[i] = novo
+                if novo.atualizado != ev.atualizado:
+                    self.dataChanged.emit(self.index(i), self.index(i))
+        i = j = 0
+        while j < len(eventos):
+            if i < len(self.eventos) and self.eventos[i].uid == eventos[j].uid:
+                i += 1; j += 1
+                continue
+            k = j
+            while k < len(eventos) and (i >= len(self.eventos) or eventos[k].uid != self.eventos[i].uid):
+                k += 1
+            self.beginInsertRows(QModelIndex(), i, i + k - j - 1)
+            self.eventos[i:i] = eventos[j:k]
+            self.endInsertRows()
+            i += k - j
+            j = k
+
+class EventoDelegate(QStyledItemDelegate):
+    # Mesmo desenho do antigo card (QFrame com três colunas de QLabels)
+    ALTURA = 100
+    MARGEM = 3
+
+    def __init__(self, lista):
+        super().__init__(lista)
+        self.lista = lista
+        base = QApplication.font()
+        def fonte(pt=None, negrito=False):
+            f = QFont(base)
+            if pt: f.setPointSize(pt)
+            f.setBold(negrito)
+            return f
+        self.f_dot, self.f_tit, self.f_loc = fonte(24), fonte(12, True), fonte(9)
+        self.f_escala, self.f_info, self.f_info_b, self.f_hora = fonte(None, True), fonte(8), fonte(8, True), fonte(14, True)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ALTURA + 2 * self.MARGEM)
+
+    def paint(self, painter, option, index):
+        ev = index.data(Qt.UserRole)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        card = QRectF(option.rect.adjusted(1, self.MARGEM, -1, -self.MARGEM))
+        hover = bool(option.state & QStyle.State_MouseOver)
+        if not hover and self.lista.piscando(ev):
+            fundo, borda, largura = "#282c34", ev.cor, 2
+        elif hover:
+            fundo, borda, largura = "#2c313a", ev.cor, 1
+        else:
+            fundo, borda, largura = "#21252b", "#181a1f", 1
+        painter.setPen(QPen(QColor(borda), largura))
+        painter.setBrush(QColor(fundo))
+        painter.drawRoundedRect(card.adjusted(largura / 2, largura / 2, -largura / 2, -largura / 2), 6, 6)
+
+        area = card.adjusted(11, 8, -11, -8)
+        painter.setFont(self.f_dot); painter.setPen(QColor(ev.cor))
+        largura_dot = QFontMetrics(self.f_dot).horizontalAdvance("●") + 8
+        painter.drawText(QRectF(area.left(), area.top(), largura_dot, area.height()), Qt.AlignVCenter | Qt.AlignLeft, "●")
+        # Colunas na proporção 3:3:2, como no layout do card
+        x, resto = area.left() + largura_dot, area.width() - largura_dot - 12
+        cols = []
+        for peso in (3, 3, 2):
+            w = resto * peso / 8
+            cols.append(QRectF(x, area.top(), w, area.height()))
+            x += w + 6
+        cor_risco = "#e06c75" if "Alto" in ev.risco_vitimas else "#98c379"
+        self._coluna(painter, cols[0], [(ev.titulo, self.f_tit, ev.cor, Qt.AlignLeft, False),
+                                        (f"📍 {ev.loc}", self.f_loc, "#abb2bf", Qt.AlignLeft, True)])
+        self._coluna(painter, cols[1], [(f"📐 {ev.escala}", self.f_escala, "#d19a66", Qt.AlignLeft, False),
+                                        (f"Impacto: {ev.impacto_tipo}", self.f_info, "#98c379", Qt.AlignLeft, False)])
+        self._coluna(painter, cols[2], [(f"Nível: {ev.impacto_nivel.upper()}", self.f_info_b, "white", Qt.AlignLeft, False),
+                                        (f"👥 {ev.risco_vitimas}", self.f_info_b, cor_risco, Qt.AlignLeft, False),
+                                        (ev.hora, self.f_hora, "#5c6370", Qt.AlignRight, False)])
+        painter.restore()
+
+    @staticmethod
+    def _coluna(painter, rect, linhas):
+        # Distribui as linhas na altura da coluna (como um QVBoxLayout); texto
+        # longo é cortado com "…", e as linhas com quebra usam até duas linhas
+        medidas = []
+        for texto, fonte, cor, alinhamento, quebra in linhas:
+            fm = QFontMetrics(fonte)
+            if quebra:
+                h = min(fm.boundingRect(0, 0, int(rect.width()), 0, Qt.TextWordWrap, texto).height(), 2 * fm.height())
             else:
-                self.set_style(False)
+                texto, h = fm.elidedText(texto, Qt.ElideRight, int(rect.width())), fm.height()
+            medidas.append((texto, fonte, cor, alinhamento, quebra, h))
+        folga = max(0.0, (rect.height() - sum(m[-1] for m in medidas)) / (len(medidas) + 1))
+        y = rect.top() + folga
+        for texto, fonte, cor, alinhamento, quebra, h in medidas:
+            painter.setFont(fonte); painter.setPen(QColor(cor))
+            opcoes = alinhamento | Qt.AlignTop | (Qt.TextWordWrap if quebra else 0)
+            painter.drawText(QRectF(rect.left(), y, rect.width(), h), opcoes, texto)
+            y += h + folga
 
-    def eventFilter(self, obj, event):
-        if event.type() == QEvent.Enter: self.set_style(True)
-        elif event.type() == QEvent.Leave: self.set_style(False)
-        return super().eventFilter(obj, event)
+class ListaEventos(QListView):
+    # Sinal para a MainWindow abrir o mapa do evento clicado
+    clique_mapa = pyqtSignal(object)
+
+    def __init__(self, relogio):
+        super().__init__()
+        self.modelo = EventosModel()
+        self.setModel(self.modelo)
+        self.setObjectName("ListaEventos")
+        self.setItemDelegate(EventoDelegate(self))
+        # Linhas de altura fixa: a view calcula a rolagem sem medir cada item
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WA_Hover, True)
+        self.viewport().setCursor(QCursor(Qt.PointingHandCursor))
+        self.clicked.connect(lambda index: self.clique_mapa.emit(index.data(Qt.UserRole)))
+        # O piscar vem do relógio compartilhado: a cada troca de fase só os
+        # cards visíveis "acontecendo agora" das categorias afetadas são repintados
+        self.relogio = relogio
+        relogio.inscrever(self._piscar)
 
-    def mousePressEvent(self, event):
-        # Emite sinal para a MainWindow abrir o mapa
-        self.clique_mapa.emit(self.evento)
+    def definir(self, eventos):
+        self.modelo.definir(eventos)
+        self._acordar()
 
-class JanelaMapa(QMainWindow):
-    def __init__(self, evento):
+    def sincronizar(self, eventos):
+        # Atualização incremental; fora do topo, o card que estava no alto da
+        # área visível continua no mesmo lugar mesmo com eventos novos acima dele
+        barra, ancora = self.verticalScrollBar(), None
+        if barra.value() > 0:
+            primeira = self.indexAt(QPoint(0, 0))
+            if primeira.isValid():
+                ancora = (self.modelo.eventos[primeira.row()].uid, self.visualRect(primeira).top())
+        self.modelo.sincronizar(eventos)
+        self._acordar()
+        if ancora:
+            linha = self.modelo.linha(ancora[0])
+            if linha is not None:
+                self.doItemsLayout()
+                barra.setValue(linha * (EventoDelegate.ALTURA + 2 * EventoDelegate.MARGEM) - ancora[1])
+
+    def piscando(self, ev):
+        return self.relogio.fase(ev.categoria) and time.time() * 1000 - ev.ts < TEMPO_RECENTE_MS
+
+    def _ha_recentes(self):
+        # A lista está em ordem decrescente de ts: basta olhar o primeiro
+        return bool(self.modelo.eventos) and time.time() * 1000 - self.modelo.eventos[0].ts < TEMPO_RECENTE_MS
+
+    def _acordar(self):
+        if self._ha_recentes():
+            self.relogio.acordar()
+
+    def _piscar(self, categorias):
+        primeira = self.indexAt(QPoint(0, 0))
+        if categorias and primeira.isValid():
+            ultima = self.indexAt(QPoint(0, self.viewport().height() - 1))
+            fim = ultima.row() if ultima.isValid() else self.modelo.rowCount() - 1
+            agora = time.time() * 1000
+            for linha in range(primeira.row(), fim + 1):
+                ev = self.modelo.eventos[linha]
+                if ev.categoria in categorias and agora - ev.ts < TEMPO_RECENTE_MS:
+                    self.update(self.modelo.index(linha))
+        return self._ha_recentes()
+
+class BuscaVizinhos(QObject):
+    # Eventos já registrados num raio em volta do evento aberto no mapa (R*Tree),
+    # numa thread própria com a sua conexão de leitura: a consulta anexa shards
+    # e não pode atrasar a abertura da janela. Só o período de
+    # JANELA_VIZINHOS_DIAS em volta do evento é consultado
+    prontos = pyqtSignal(object, list)
+
+    def __init__(self):
         super().__init__()
-        self.setWindowTitle(f"Monitoramento: {evento.loc}")
-        self.setWindowIcon(QIcon(":/img/favicon.png"))
-        self.resize(1000, 700)
-        self.browser = QWebEngineView()
-        
-        zoom = 6
-        raio = 0
-        if evento.categoria == "sismo": zoom = 9
-        elif evento.categoria == "vulcao": zoom = 11; raio = 15000
-        elif evento.categoria == "tsunami": zoom = 5; raio = 200000
-        elif evento.categoria == "clima": zoom = 6; raio = 150000
-        elif evento.categoria == "solar": zoom = 2;
+        self.fila = queue.Queue()
+        threading.Thread(target=self._executar, name="mapa-vizinhos", daemon=True).start()
+
+    def pedir(self, evento):
+        if (evento.lat, evento.lon) != (0.0, 0.0):
+            self.fila.put(evento)
+
+    def _executar(self):
+        db = LeitorDB()
+        while True:
+            evento = self.fila.get()
+            vizinhos = []
+            try:
+                margem = JANELA_VIZINHOS_DIAS * MS_DIA
+                for r in db.buscar_raio(evento.lat, evento.lon, RAIO_VIZINHOS_KM, limite=MAX_VIZINHOS + 1,
+                                        inicio=int(evento.ts) - margem, fim=int(evento.ts) + margem):
+                    r = dict(zip(db.COLUNAS_GEO, r))
+                    if r["uid"] != evento.uid:
+                        quando = datetime.fromtimestamp(r["ts"] / 1000).strftime("%Y-%m-%d %H:%M")
+                        vizinhos.append([r["lat"], r["lon"], f"{r['loc']}<br>{quando}<br>{r['escala_tecnica']}"])
+            except Exception as e:
+                print(f"Erro ao buscar eventos próximos: {e}")
+            self.prontos.emit(evento, vizinhos[:MAX_VIZINHOS])
 
-        html = f"""
+class JanelaMapa(QMainWindow):
+    # Janela reaproveitável: a página (Leaflet e camada de tiles) é carregada
+    # uma vez; mostrar() só redireciona o mapa por JavaScript e troca os
+    # marcadores, e os vizinhos chegam depois (BuscaVizinhos) por
+    # mostrar_vizinhos(). Fechar apenas esconde a janela, que volta ao pool
+    HTML = """
         <html>
         <head>
             <link rel='stylesheet' href='https://unpkg.com/leaflet@1.7.1/dist/leaflet.css'/>
             <script src='https://unpkg.com/leaflet@1.7.1/dist/leaflet.js'></script>
-            <style>body {{ margin: 0; background-color: #1e2227; }} #map {{ width: 100%; height: 100%; }}</style>
+            <style>body { margin: 0; background-color: #1e2227; } #map { width: 100%; height: 100%; }</style>
         </head>
         <body>
             <div id='map'></div>
             <script>
-                var map = L.map('map').setView([{evento.lat}, {evento.lon}], {zoom});
-                L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{ attribution: 'GeoEvent' }}).addTo(map);
-                var iconColor = "{evento.cor}";
-                L.marker([{evento.lat}, {evento.lon}]).addTo(map)
-                    .bindPopup("<b style='color:{evento.cor}'>{evento.titulo}</b><br>{evento.loc}<br>Escala: {evento.escala}")
-                    .openPopup();
-                if ({raio} > 0) {{
-                    L.circle([{evento.lat}, {evento.lon}], {{ color: iconColor, fillColor: iconColor, fillOpacity: 0.2, radius: {raio} }}).addTo(map);
-                }}
+                var map = L.map('map').setView([0, 0], 2);
+                L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', { attribution: 'GeoEvent' }).addTo(map);
+                var camada = L.layerGroup().addTo(map);
+                function mostrar(d) {
+                    camada.clearLayers();
+                    map.invalidateSize();
+                    map.setView([d.lat, d.lon], d.zoom);
+                    L.marker([d.lat, d.lon]).addTo(camada).bindPopup(d.popup).openPopup();
+                    if (d.raio > 0) {
+                        L.circle([d.lat, d.lon], { color: d.cor, fillColor: d.cor, fillOpacity: 0.2, radius: d.raio }).addTo(camada);
+                    }
+                }
+                function vizinhos(lista) {
+                    lista.forEach(function(v) {
+                        L.circleMarker([v[0], v[1]], { radius: 4, color: '#abb2bf', weight: 1, fillOpacity: 0.5 }).addTo(camada).bindPopup(v[2]);
+                    });
+                }
             </script>
         </body>
         </html>
-        """
-        self.browser.setHtml(html)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowIcon(QIcon(":/img/favicon.png"))
+        self.resize(1000, 700)
+        self.evento = None
+        # None = carregando; depois, se a página (e o Leaflet) carregou
+        self.pronta = None
+        # Chamadas JavaScript feitas antes de a página terminar de carregar
+        self.pendentes = []
+        self.browser = QWebEngineView()
+        self.browser.loadFinished.connect(self._carregada)
+        self.browser.setHtml(self.HTML)
         self.setCentralWidget(self.browser)
 
+    def _carregada(self, ok):
+        self.pronta = ok
+        if ok:
+            for js in self.pendentes:
+                self.browser.page().runJavaScript(js)
+            self.pendentes = []
+
+    def _executar(self, js):
+        if self.pronta:
+            self.browser.page().runJavaScript(js)
+            return
+        # Ainda carregando (aplica ao terminar) ou falhou (ex.: sem rede): tenta de novo
+        self.pendentes.append(js)
+        if self.pronta is False:
+            self.pronta = None
+            self.browser.setHtml(self.HTML)
+
+    def mostrar(self, evento):
+        self.evento = evento
+        self.setWindowTitle(f"Monitoramento: {evento.loc}")
+        zoom = 6
+        raio = 0
+        if evento.categoria == "sismo": zoom = 9
+        elif evento.categoria == "vulcao": zoom = 11; raio = 15000
+        elif evento.categoria == "tsunami": zoom = 5; raio = 200000
+        elif evento.categoria == "clima": zoom = 6; raio = 150000
+        elif evento.categoria == "solar": zoom = 2;
+
+        dados = {"lat": evento.lat, "lon": evento.lon, "zoom": zoom, "raio": raio, "cor": evento.cor,
+                 "popup": f"<b style='color:{evento.cor}'>{evento.titulo}</b><br>{evento.loc}<br>Escala: {evento.escala}"}
+        self._executar(f"mostrar({json.dumps(dados)});")
+
+    def mostrar_vizinhos(self, evento, vizinhos):
+        # Resultado atrasado de um evento que a janela já não mostra: descartado
+        if evento is self.evento and vizinhos:
+            self._executar(f"vizinhos({json.dumps(vizinhos)});")
+
 class TileMenu(QPushButton):
+    # Aparência toda no ESTILO_APP, por objectName e propriedades dinâmicas
+    # (categoria, hover, piscando): mudar de estado só troca a propriedade
     def __init__(self, titulo, tipo, cor):
         super().__init__()
+        self.setObjectName("Tile")
+        self.setProperty("categoria", tipo)
         self.setFixedSize(200, 110)
         self.tipo, self.cor = tipo, cor
+        # ts do evento mais recente da categoria (o tile pisca enquanto for "agora")
+        self.ultimo_ts = 0
         self.setCursor(QCursor(Qt.PointingHandCursor))
         self.installEventFilter(self)
         l = QVBoxLayout(self)
-        self.lbl_t = QLabel(titulo)
-        self.lbl_t.setStyleSheet("font-weight: bold; font-size: 10pt; color: white; background: transparent;")
-        self.lbl_info = QLabel("Aguardando dados...")
-        self.lbl_info.setStyleSheet("font-size: 7pt; color: #abb2bf; background: transparent;")
+        self.lbl_t = QLabel(titulo); self.lbl_t.setObjectName("TileTitulo")
+        self.lbl_info = QLabel("Aguardando dados..."); self.lbl_info.setObjectName("TileInfo")
         l.addWidget(self.lbl_t, 0, Qt.AlignCenter); l.addWidget(self.lbl_info, 0, Qt.AlignCenter)
-        self.set_default_style()
 
-    def set_default_style(self):
-        self.setStyleSheet(f"QPushButton {{ background-color: #282c34; border-bottom: 4px solid {self.cor}; border-radius: 8px; }}")
+    def _estado(self, nome, valor, alvos):
+        # Troca a propriedade e faz o re-polish só dos widgets afetados; o
+        # stylesheet em si não é refeito
+        if self.property(nome) == valor:
+            return
+        for w in alvos:
+            w.setProperty(nome, valor)
+            w.style().unpolish(w); w.style().polish(w)
 
-    def set_hover_style(self):
-        self.setStyleSheet(f"QPushButton {{ background-color: {self.cor}; border-bottom: 4px solid {self.cor}; border-radius: 8px; }}")
+    def piscar(self, ligado):
+        self._estado("piscando", ligado, (self,))
 
     def eventFilter(self, obj, event):
-        if event.type() == QEvent.Enter:
-            self.set_hover_style()
-            self.lbl_t.setStyleSheet("color: black; font-weight: bold; background: transparent;")
-            self.lbl_info.setStyleSheet("color: #282c34; background: transparent;")
-        elif event.type() == QEvent.Leave:
-            self.set_default_style()
-            self.lbl_t.setStyleSheet("color: white; font-weight: bold; background: transparent;")
-            self.lbl_info.setStyleSheet("color: #abb2bf; background: transparent;")
+        # O hover também muda a cor dos rótulos
+        if event.type() == QEvent.Enter: self._estado("hover", True, (self, self.lbl_t, self.lbl_info))
+        elif event.type() == QEvent.Leave: self._estado("hover", False, (self, self.lbl_t, self.lbl_info))
         return super().eventFilter(obj, event)
 
 # --- JANELA PRINCIPAL ---
+# Stylesheet único da aplicação (aplicado uma vez). Seletores por objectName e
+# propriedade, sem descendentes: o re-polish de um widget só compara regras simples
+ESTILO_APP = """
+* { font-family: 'Segoe UI'; }
+QMainWindow#Principal { background-color: #1e2227; }
+QListView#ListaEventos { background-color: #1e2227; border: none; }
+QLabel#Logo { font-size: 18pt; font-weight: bold; color: #61afef; }
+QPushButton#Voltar { background: #c678dd; color: white; font-weight: bold; padding: 5px; border-radius: 4px; }
+QPushButton#Historico { background: #3e4451; color: white; padding: 5px 15px; border-radius: 4px; }
+QPushButton#Bip { background: transparent; border: 1px solid #e06c75; color: #e06c75; padding: 5px; border-radius: 4px; font-weight: bold; }
+QPushButton#Bip[ligado="true"] { border-color: #98c379; color: #98c379; }
+QPushButton#Tile { background-color: #282c34; border-radius: 8px; }
+QPushButton#Tile[piscando="true"] { background-color: #323842; }
+QLabel#TileTitulo { font-weight: bold; font-size: 10pt; color: white; background: transparent; }
+QLabel#TileInfo { font-size: 7pt; color: #abb2bf; background: transparent; }
+QLabel#TileTitulo[hover="true"] { color: black; }
+QLabel#TileInfo[hover="true"] { color: #282c34; }
+""" + "".join(f"""
+QPushButton#Tile[categoria="{cat}"] {{ border-bottom: 4px solid {cor}; }}
+QPushButton#Tile[categoria="{cat}"][hover="true"] {{ background-color: {cor}; }}
+""" for cat, cor in CORES_CATEGORIA.items())
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.db = DBManager()
+        # Cria/migra o esquema antes de qualquer thread abrir o banco; a GUI só lê
+        DBManager().conn.close()
+        self.db = LeitorDB()
         self.bip_ativo = False
-        self.maiores_ts_vistos = {}
         self.categoria_ativa = "Geral"
         self.eventos_cache = []
+        # Último lote recebido por categoria (cada fonte chega no seu ritmo)
+        self.eventos_por_cat = {}
         
-        # LISTA para manter referências das janelas de mapa abertas e evitar Garbage Collection
-        self.janelas_mapa = []
+        # Pool de janelas de mapa, da usada há mais tempo para a mais recente. A
+        # primeira já nasce carregando a página, para o primeiro clique ser imediato
+        self.janelas_mapa = [JanelaMapa()]
+        self.busca_vizinhos = BuscaVizinhos()
+        self.busca_vizinhos.prontos.connect(self.mostrar_vizinhos)
 
         self.setWindowTitle(VERSAO)
         self.setWindowIcon(QIcon(":/img/favicon.png"))
         self.resize(1200, 850)
-        self.setStyleSheet("QMainWindow, QWidget { background-color: #1e2227; font-family: 'Segoe UI'; } QScrollArea { border: none; }")
+        self.setObjectName("Principal")
+        QApplication.instance().setStyleSheet(ESTILO_APP)
 
         container = QWidget(); self.main_layout = QVBoxLayout(container)
         
         header = QHBoxLayout()
-        lbl_logo = QLabel("")
-        lbl_logo.setStyleSheet("font-size: 18pt; font-weight: bold; color: #61afef;")
-        self.btn_back = QPushButton("⬅ Voltar à Visão Geral")
-        self.btn_back.setStyleSheet("background: #c678dd; color: white; font-weight: bold; padding: 5px; border-radius: 4px;")
+        lbl_logo = QLabel(""); lbl_logo.setObjectName("Logo")
+        self.btn_back = QPushButton("⬅ Voltar à Visão Geral"); self.btn_back.setObjectName("Voltar")
         self.btn_back.clicked.connect(self.voltar_geral); self.btn_back.hide()
-        self.btn_bip = QPushButton("🔊 SOM: OFF")
+        self.btn_bip = QPushButton("🔊 SOM: OFF"); self.btn_bip.setObjectName("Bip")
         self.btn_bip.setCheckable(True); self.btn_bip.clicked.connect(self.toggle_bip); self.update_btn_bip()
-        btn_hist = QPushButton("📜 Histórico"); btn_hist.clicked.connect(lambda: JanelaHistorico(self.db).exec_())
-        btn_hist.setStyleSheet("background: #3e4451; color: white; padding: 5px 15px; border-radius: 4px;")
+        btn_hist = QPushButton("📜 Histórico"); btn_hist.setObjectName("Historico")
+        btn_hist.clicked.connect(lambda: JanelaHistorico(self.db).exec_())
 
         header.addWidget(lbl_logo); header.addStretch(); header.addWidget(self.btn_back); header.addWidget(self.btn_bip); header.addWidget(btn_hist)
         self.main_layout.addLayout(header)
 
-        self.tiles = {
-            "sismo": TileMenu("TERREMOTOS", "sismo", "#61afef"),
-            "tsunami": TileMenu("TSUNAMIS", "tsunami", "#98c379"), # Atualizado para VERDE
-            "vulcao": TileMenu("VULCÕES", "vulcao", "#e06c75"),   # Atualizado para VERMELHO
-            "clima": TileMenu("CLIMA / FURACÃO", "clima", "#c678dd"),
-            "solar": TileMenu("ATIV. SOLAR", "solar", "#e5c07b")
-        }
+        titulos = {"sismo": "TERREMOTOS", "tsunami": "TSUNAMIS", "vulcao": "VULCÕES",
+                   "clima": "CLIMA / FURACÃO", "solar": "ATIV. SOLAR"}
+        self.tiles = {cat: TileMenu(titulo, cat, CORES_CATEGORIA[cat]) for cat, titulo in titulos.items()}
         tile_layout = QHBoxLayout()
         for k, t in self.tiles.items(): tile_layout.addWidget(t); t.clicked.connect(lambda ch, tipo=k: self.filtrar(tipo))
         self.main_layout.addLayout(tile_layout)
 
-        self.scroll = QScrollArea(); self.scroll.setWidgetResizable(True)
-        self.list_w = QWidget(); self.list_l = QVBoxLayout(self.list_w); self.list_l.setAlignment(Qt.AlignTop)
-        self.scroll.setWidget(self.list_w); self.main_layout.addWidget(self.scroll)
+        self.relogio = RelogioAnimacao(self)
+        self.relogio.inscrever(self.piscar_tiles)
+        self.lista = ListaEventos(self.relogio)
+        self.lista.clique_mapa.connect(self.abrir_mapa)
+        self.main_layout.addWidget(self.lista)
+        self.timer_lista = QTimer(self)
+        self.timer_lista.setSingleShot(True)
+        self.timer_lista.setInterval(INTERVALO_LISTA_MS)
+        self.timer_lista.timeout.connect(self.atualizar_lista)
         self.setCentralWidget(container)
 
-        self.timer = QTimer(); self.timer.timeout.connect(self.coletar_dados); self.timer.start(60000)
+        self.pipeline = PipelineColeta([SismoService, TsunamiService, VulcaoService, SolarService, ClimaService])
+        self.pipeline.lote_pronto.connect(self.receber_lote)
+        self.agendador = AgendadorFontes(self.pipeline)
         self.coletar_dados()
 
     def abrir_mapa(self, evento):
-        # Cria a janela e armazena na lista da MainWindow para persistir
-        mapa = JanelaMapa(evento)
+        # Prefere uma janela fechada; com todas abertas, cria outra até
+        # MAX_JANELAS_MAPA e, daí em diante, redireciona a usada há mais tempo
+        mapa = next((j for j in self.janelas_mapa if not j.isVisible()), None)
+        if mapa is None and len(self.janelas_mapa) < MAX_JANELAS_MAPA:
+            mapa = JanelaMapa()
+        elif mapa is None:
+            mapa = self.janelas_mapa[0]
+        if mapa in self.janelas_mapa:
+            self.janelas_mapa.remove(mapa)
         self.janelas_mapa.append(mapa)
-        mapa.show()
-        # Opcional: Limpar janelas fechadas da lista para não acumular memória infinitamente
-        # (Lógica simples: remove referências antigas se a lista ficar muito grande)
-        if len(self.janelas_mapa) > 10:
-            self.janelas_mapa.pop(0)
+        mapa.mostrar(evento)
+        mapa.show(); mapa.raise_(); mapa.activateWindow()
+        self.busca_vizinhos.pedir(evento)
+
+    def mostrar_vizinhos(self, evento, vizinhos):
+        for mapa in self.janelas_mapa:
+            mapa.mostrar_vizinhos(evento, vizinhos)
 
-    def toggle_bip(self): self.bip_ativo = self.btn_bip.isChecked(); self.update_btn_bip()
+    def toggle_bip(self): self.bip_ativo = self.pipeline.bip_ativo = self.btn_bip.isChecked(); self.update_btn_bip()
     def update_btn_bip(self):
-        txt, cor = ("🔊 SOM: ON", "#98c379") if self.bip_ativo else ("🔇 SOM: OFF", "#e06c75")
-        self.btn_bip.setText(txt); self.btn_bip.setStyleSheet(f"background: transparent; border: 1px solid {cor}; color: {cor}; padding: 5px; border-radius: 4px; font-weight: bold;")
+        self.btn_bip.setText("🔊 SOM: ON" if self.bip_ativo else "🔇 SOM: OFF")
+        self.btn_bip.setProperty("ligado", self.bip_ativo)
+        self.btn_bip.style().unpolish(self.btn_bip); self.btn_bip.style().polish(self.btn_bip)
     
     def voltar_geral(self): self.categoria_ativa = "Geral"; self.btn_back.hide(); self.renderizar_lista()
     def filtrar(self, categoria): self.categoria_ativa = categoria; self.btn_back.show(); self.renderizar_lista()
 
     def coletar_dados(self):
-        novos_eventos = []
-        servicos = [SismoService, TsunamiService, VulcaoService, SolarService, ClimaService]
-        som_tocar = False
-        for s in servicos:
-            dados = s.fetch()
-            for d in dados:
-                novos_eventos.append(d); self.db.salvar_evento(d)
-                if d.ts > self.maiores_ts_vistos.get(d.categoria, 0):
-                    self.maiores_ts_vistos[d.categoria] = d.ts; som_tocar = True
-        
-        if som_tocar and self.bip_ativo and winsound: winsound.Beep(1200, 300)
-        novos_eventos.sort(key=lambda x: x.ts, reverse=True)
-        self.eventos_cache = novos_eventos
+        # Dispara todas as fontes agora; o resultado volta por receber_lote
+        self.agendador.disparar_todas()
+
+    def receber_lote(self, lote, falhas):
+        # Feeds inalterados (ou em falha) chegam com a mesma lista do ciclo
+        # anterior; só uma lista nova agenda a atualização da lista na tela
+        if any(evs is not self.eventos_por_cat.get(cat) for cat, evs in lote.items()):
+            if not self.timer_lista.isActive():
+                self.timer_lista.start()
+        self.eventos_por_cat.update(lote)
         
-        for cat, tile in self.tiles.items():
-            evs = [e for e in novos_eventos if e.categoria == cat]
-            if evs: tile.lbl_info.setText(f"Último: {evs[0].hora}\n{evs[0].loc[:20]}...")
+        estat = CLIENTE_HTTP.estatisticas()
+        for cat in lote:
+            tile = self.tiles[cat]
+            evs = self.eventos_por_cat[cat]
+            if cat in falhas:
+                host = urlsplit(FONTES[self.pipeline.fonte_de(cat)].url).netloc
+                tile.lbl_info.setText(f"⚠ Falha na coleta ({estat.get(host, {}).get('falhas', 0)}x)")
+            elif evs:
+                ultimo = max(evs, key=lambda e: e.ts)
+                tile.ultimo_ts = ultimo.ts
+                if time.time() * 1000 - ultimo.ts < TEMPO_RECENTE_MS:
+                    self.relogio.acordar()
+                tile.lbl_info.setText(f"Último: {ultimo.hora}\n{ultimo.loc[:20]}...")
             else: tile.lbl_info.setText("Sem alertas recentes")
-        self.renderizar_lista()
+            tile.setToolTip(falhas.get(cat, ""))
+
+    def piscar_tiles(self, categorias):
+        agora, vivos = time.time() * 1000, False
+        for cat, tile in self.tiles.items():
+            vivo = agora - tile.ultimo_ts < TEMPO_RECENTE_MS
+            vivos = vivos or vivo
+            if cat in categorias or not vivo:
+                tile.piscar(vivo and self.relogio.fase(cat))
+        return vivos
+
+    def atualizar_lista(self):
+        # Todos os lotes recebidos desde a última atualização, de uma vez
+        eventos = {}
+        for evs in self.eventos_por_cat.values():
+            for ev in evs:
+                eventos.setdefault(ev.uid, ev)
+        self.eventos_cache = sorted(eventos.values(), key=lambda x: (x.ts, x.uid), reverse=True)
+        self.lista.sincronizar(self.filtrados())
+
+    def closeEvent(self, event):
+        self.pipeline.encerrar()
+        super().closeEvent(event)
+
+    def filtrados(self):
+        return [ev for ev in self.eventos_cache if self.categoria_ativa == "Geral" or ev.categoria == self.categoria_ativa]
 
     def renderizar_lista(self):
-        while self.list_l.count():
-            item = self.list_l.takeAt(0)
-            if item.widget(): item.widget().deleteLater()
-
-        agora_ms = datetime.now().timestamp() * 1000
-
-        for ev in self.eventos_cache:
-            if self.categoria_ativa == "Geral" or ev.categoria == self.categoria_ativa:
-                
-                # CORREÇÃO LÓGICA PISCAR:
-                # Pisca se o evento aconteceu dentro do intervalo definido (ex: 40 minutos atrás até agora)
-                diferenca = agora_ms - ev.ts
-                is_happening_now = diferenca < TEMPO_RECENTE_MS
-
-                row = EventoRow(ev, is_happening_now)
-                
-                # CONEXÃO DO SINAL:
-                # Quando o Row emitir 'clique_mapa', chama self.abrir_mapa desta classe
-                row.clique_mapa.connect(self.abrir_mapa)
-                
-                self.list_l.addWidget(row)
+        # Troca de filtro: o modelo recebe a lista nova de uma vez (volta ao
+        # topo); só as linhas visíveis são pintadas
+        self.lista.definir(self.filtrados())
 
 class JanelaHistorico(QDialog):
     def __init__(self, db):
@@ -522,9 +1450,9 @@ class JanelaHistorico(QDialog):
                     header.setStyleSheet("font-weight: bold; color: #61afef; margin-top: 10px;")
                     self.l_lista.addWidget(header)
                     
-                    for r in rows:
-                        # r[11] é data, r[3] é local, r[7] é impacto, r[10] é hora
-                        texto = f"[{r[10]}] {r[3]} | {r[7]}"
+                    for ts, loc, escala in rows:
+                        hora = datetime.fromtimestamp(ts / 1000).strftime("%H:%M")
+                        texto = f"[{hora}] {loc} | {escala}"
                         item_label = QLabel(texto)
                         item_label.setStyleSheet("border-bottom: 1px solid #3e4451; padding: 2px;")
                         self.l_lista.addWidget(item_label)
@@ -532,4 +1460,33 @@ class JanelaHistorico(QDialog):
                 print(f"Erro ao buscar categoria {c}: {e}")
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv); win = MainWindow(); win.show(); sys.exit(app.exec_())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=VERSAO)
+    parser.add_argument("--backfill", nargs=2, metavar=("INICIO", "FIM"),
+                        help="baixa o histórico da USGS (FDSN) entre duas datas AAAA-MM-DD e sai")
+    parser.add_argument("--url", default=URL_FDSN, help="endpoint FDSN 'query' (ex.: servidor local de testes)")
+    parser.add_argument("--janela-dias", type=float, default=BACKFILL_JANELA_DIAS)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--req-por-s", type=float, default=BACKFILL_REQ_POR_S)
+    parser.add_argument("--manutencao", action="store_true",
+                        help="gera rollups, aplica a retenção, compacta o histórico e sai")
+    args, qt_args = parser.parse_known_args()
+
+    if args.backfill:
+        inicio, fim = (datetime.fromisoformat(d) for d in args.backfill)
+        db = DBManager()
+        backfill = Backfill(db, inicio, fim, url=args.url, janela_dias=args.janela_dias,
+                            workers=args.workers, req_por_s=args.req_por_s)
+        backfill.executar()
+        # Resume/aplica a retenção no histórico novo e sela os meses antigos;
+        # com janelas pendentes fica para depois que a execução for retomada
+        if backfill.falhas:
+            print(f"{backfill.falhas} janela(s) pendente(s): manutenção adiada até o backfill ser retomado")
+        else:
+            db.manutencao()
+        sys.exit(0)
+
+    if args.manutencao:
+        DBManager().manutencao()
+        sys.exit(0)
+
+    app = QApplication(sys.argv[:1] + qt_args); win = MainWindow(); win.show(); sys.exit(app.exec_())
\ No newline at end of file
@@ -1,8 +1,8 @@
 import sys
-import sqlite3
 import pandas as pd
 import numpy as np
 import os
+import time
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
@@ -18,10 +18,137 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QFileDialog, QMessageBox, QTextEdit)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QColor
+from banco import (LeitorDB, Particoes, CATEGORIAS, NOMES_CATEGORIA, CELULA_GRAUS, MS_DIA,
+                   centro_celula, distancia_km, regiao_de)
+
+# Motor analítico opcional (pip install duckdb); sem ele tudo roda em SQLite + pandas
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
 
 # --- CONFIGURAÇÃO DE CAMINHO ---
 DB_PATH = r"D:\Automacoes\Automacoes\historico_v5.db"
 MAPA_LOCAL = r"D:\Automacoes\Automacoes\world_map.geojson"
+# Raio usado para contar o histórico em volta de uma zona da IA
+RAIO_ZONA_KM = 500
+# Linhas da tabela de frequências
+TOP_REGIOES = 12
+# Períodos do seletor (dias; None = todo o histórico). Acima de JANELA_BRUTA_DIAS
+# o mapa usa os rollups diários (uma marca por célula, com peso) em vez dos eventos
+PERIODOS = [("30 DIAS", 30), ("1 ANO", 365), ("TUDO", None)]
+JANELA_BRUTA_DIAS = 90
+# Leitura dos eventos brutos: só as colunas do mapa e da IA, em blocos já
+# convertidos para tipos compactos. O texto (local, título, escala) é buscado
+# por (ts, id) quando um ponto é clicado ou exportado
+COLUNAS_MAPA = "id, ts, categoria, mag, lat, lon"
+LINHAS_POR_BLOCO = 100000
+TIPO_CATEGORIA = pd.CategoricalDtype(list(NOMES_CATEGORIA.values()))
+# Usa o DuckDB quando instalado. Nos períodos curtos a IA recebe os eventos já
+# agrupados numa grade de GRADE_HOTSPOTS_GRAUS (com peso), não um ponto por evento,
+# com ou sem DuckDB (agrupar_grade e MotorDuckDB.grade fazem a mesma conta)
+USAR_DUCKDB = True
+GRADE_HOTSPOTS_GRAUS = 0.1
+
+def agrupar_grade(df):
+    # Eventos brutos -> centro da célula de GRADE_HOTSPOTS_GRAUS com a soma dos
+    # pesos. Coordenada em float32 (como em compactar) e célula pelo centro,
+    # que nunca cai em 0 (descartado pela IA como "sem coordenada")
+    if df.empty:
+        return pd.DataFrame(columns=['lat', 'lon', 'peso'])
+    validos = df[(df['lat'] != 0) & (df['lon'] != 0)]
+    g = GRADE_HOTSPOTS_GRAUS
+    celulas = pd.DataFrame({
+        'lat': np.floor(validos['lat'].astype('float32').astype('float64') / g) * g + g / 2,
+        'lon': np.floor(validos['lon'].astype('float32').astype('float64') / g) * g + g / 2,
+        'peso': validos['peso'].astype('int64'),
+    })
+    return celulas.groupby(['lat', 'lon'], as_index=False)['peso'].sum()
+
+class MotorDuckDB:
+    # Agregações do analisador em DuckDB (vetorizado e multithread) sobre os
+    # mesmos arquivos SQLite, anexados somente leitura: o principal (rollups) e
+    # os shards que o catálogo indicar para o período. O roteamento continua no
+    # LeitorDB; os resultados vão do DuckDB para o DataFrame coluna a coluna
+    def __init__(self, leitor, caminho):
+        self.leitor = leitor
+        self.con = duckdb.connect()
+        try:
+            self.con.execute("LOAD sqlite")
+        except duckdb.Error:
+            self.con.execute("INSTALL sqlite")
+            self.con.execute("LOAD sqlite")
+        self.anexados = set()
+        self._anexar(caminho, "principal")
+
+    def _anexar(self, arquivo, nome):
+        if nome not in self.anexados:
+            arquivo = arquivo.replace("'", "''")
+            self.con.execute(f"ATTACH '{arquivo}' AS {nome} (TYPE sqlite, READ_ONLY)")
+            self.anexados.add(nome)
+        return nome
+
+    def _shard(self, mes):
+        return self._anexar(self.leitor.particoes.arquivo(mes), Particoes.esquema(mes))
+
+    def _eventos(self, colunas, inicio, categoria):
+        # UNION ALL dos shards do período, com os filtros de carregar_dados
+        partes, params = [], []
+        for mes in self.leitor.particoes.meses(inicio):
+            filtros = ["lat IS NOT NULL", "lat != 0"]
+            if inicio is not None:
+                filtros.append("ts >= ?")
+                params.append(inicio)
+            if categoria:
+                filtros.append("categoria = ?")
+                params.append(CATEGORIAS[categoria])
+            partes.append(f"SELECT {colunas} FROM {self._shard(mes)}.eventos WHERE {' AND '.join(filtros)}")
+        return " UNION ALL ".join(partes), params
+
+    def pontos(self, inicio, categoria=None):
+        # Mesmas colunas de carregar_dados (COLUNAS_MAPA)
+        sql, params = self._eventos(COLUNAS_MAPA, inicio, categoria)
+        return self.con.execute(sql, params).df() if sql else pd.DataFrame()
+
+    def grade(self, inicio, categoria=None):
+        # Entrada da IA: a mesma grade de agrupar_grade (float32, centro da
+        # célula, mesma ordem), para os hotspots não dependerem do motor
+        sql, params = self._eventos("lat, lon", inicio, categoria)
+        if not sql:
+            return pd.DataFrame(columns=['lat', 'lon', 'peso'])
+        g = f"CAST({GRADE_HOTSPOTS_GRAUS!r} AS DOUBLE)"
+        celula = "floor(CAST(CAST({c} AS FLOAT) AS DOUBLE) / {g}) * {g} + {g} / 2"
+        return self.con.execute(f"""
+            SELECT {celula.format(c="lat", g=g)} AS lat, {celula.format(c="lon", g=g)} AS lon, count(*) AS peso
+            FROM ({sql}) AS t WHERE lon IS NOT NULL AND lon != 0
+            GROUP BY ALL ORDER BY lat, lon
+        """, params).df()
+
+    def celulas(self, inicio, categoria=None):
+        # Totais por categoria x célula no período (mesmas colunas que
+        # carregar_rollups agrupa): rollup_diario mais os trechos ainda não
+        # consolidados, agregados na hora com a grade de banco.SQL_AGREGADO
+        dia_ini = None if inicio is None else inicio // MS_DIA
+        filtro_cat = " AND categoria = ?" if categoria else ""
+        cat = [CATEGORIAS[categoria]] if categoria else []
+        partes = [f"SELECT categoria, celula, eventos, mag_max, dia FROM principal.rollup_diario "
+                  f"WHERE dia >= ?{filtro_cat}"]
+        params = [dia_ini if dia_ini is not None else -1] + cat
+        colunas, linhas = int(360 / CELULA_GRAUS), int(180 / CELULA_GRAUS)
+        for mes, de, ate in self.leitor.sem_rollup(None if dia_ini is None else dia_ini * MS_DIA):
+            partes.append(f"""
+                SELECT categoria,
+                       CASE WHEN lat IS NULL OR lon IS NULL OR (lat = 0 AND lon = 0) THEN -1
+                            ELSE least(CAST(trunc((lat + 90) / {CELULA_GRAUS}) AS INTEGER), {linhas - 1}) * {colunas}
+                                 + least(CAST(trunc((lon + 180) / {CELULA_GRAUS}) AS INTEGER), {colunas - 1}) END,
+                       1, mag, ts // {MS_DIA}
+                FROM {self._shard(mes)}.eventos WHERE ts >= ? AND ts < ?{filtro_cat}""")
+            params += [de, ate] + cat
+        return self.con.execute(f"""
+            SELECT categoria, celula, CAST(SUM(eventos) AS BIGINT) AS peso, MAX(mag_max) AS mag_max, MAX(dia) AS dia
+            FROM ({" UNION ALL ".join(partes)}) AS t(categoria, celula, eventos, mag_max, dia)
+            GROUP BY categoria, celula
+        """, params).df()
 
 class IAEngine:
     def __init__(self, df):
@@ -36,10 +163,12 @@ class IAEngine:
         kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
         
         # O fit_predict associa cada evento a um cluster específico
-        self.df_geo['cluster_label'] = kmeans.fit_predict(coords)
+        # (com rollups, cada célula pesa o número de eventos que resume)
+        self.df_geo['cluster_label'] = kmeans.fit_predict(coords, sample_weight=self.df_geo['peso'])
         
         # Calcula a densidade (probabilidade real) de cada região
-        contagem = self.df_geo['cluster_label'].value_counts(normalize=True) * 100
+        pesos = self.df_geo.groupby('cluster_label')['peso'].sum()
+        contagem = pesos / pesos.sum() * 100
         centros = kmeans.cluster_centers_
         
         hotspots_com_info = []
@@ -60,10 +189,28 @@ class AnaliseWindow(QMainWindow):
         self.setStyleSheet("background-color: #1e2227; color: #abb2bf; font-family: 'Segoe UI';")
         
         self.filtro_ativo = "Geral"
+        self.periodo = None
+        self.agregado = False
         self.blink_status = True
         self.hotspots_info = []
+        # Hotspots já calculados no período atual, por filtro
+        self.cache_hotspots = {}
         
-        self.df_total = self.carregar_dados()
+        # Conexão somente leitura (WAL): não disputa lock com o GeoEventViewer gravando.
+        # Também atende às consultas espaciais (R*Tree) da região visível e das zonas da IA
+        self.db = LeitorDB(DB_PATH) if os.path.exists(DB_PATH) else None
+        self.motor = None
+        if self.db is not None and USAR_DUCKDB and duckdb is not None:
+            try:
+                self.motor = MotorDuckDB(self.db, DB_PATH)
+            except Exception as e:
+                print(f"Erro ao iniciar o DuckDB (usando SQLite): {e}")
+        self.carregar_periodo()
+        # Zoom/pan disparam muitos eventos de limite: recarrega só quando parar
+        self.timer_regiao = QTimer()
+        self.timer_regiao.setSingleShot(True)
+        self.timer_regiao.setInterval(300)
+        self.timer_regiao.timeout.connect(self.atualizar_regiao)
         self.init_ui()
         
         # Timer para o Blink das Zonas Críticas
@@ -71,13 +218,110 @@ class AnaliseWindow(QMainWindow):
         self.timer_blink.timeout.connect(self.toggle_blink)
         self.timer_blink.start(600)
 
-    def carregar_dados(self):
-        if not os.path.exists(DB_PATH): 
+    def inicio_periodo(self):
+        return None if self.periodo is None else int((time.time() - self.periodo * 86400) * 1000)
+
+    def carregar_periodo(self):
+        # O resumo do cubo é lido por período; os eventos (ou rollups) de cada
+        # filtro só na primeira vez que ele é exibido (ver dados_filtro)
+        self.agregado = self.periodo is None or self.periodo > JANELA_BRUTA_DIAS
+        self.frames = {}
+        self.df_cubo = self.carregar_cubo()
+        self.cache_hotspots = {}
+
+    def dados_filtro(self, filtro):
+        # Uma categoria é lida com o filtro no SQL; "Geral" lê tudo e já deixa
+        # as categorias separadas, então trocar de filtro depois dele não relê nem varre
+        if filtro not in self.frames:
+            if filtro == "Geral":
+                df = self.carregar_dados()
+                self.frames = {cat: df.iloc[0:0] for cat in TIPO_CATEGORIA.categories}
+                if not df.empty:
+                    self.frames.update({cat: parte for cat, parte in df.groupby('categoria', observed=True)})
+                self.frames["Geral"] = df
+            else:
+                self.frames[filtro] = self.carregar_dados(filtro)
+        return self.frames[filtro]
+
+    def carregar_cubo(self):
+        colunas = ['categoria', 'regiao', 'faixa_mag', 'eventos', 'mag_soma']
+        if self.db is None:
+            return pd.DataFrame(columns=colunas)
+        df = pd.DataFrame(self.db.resumo_cubo(self.inicio_periodo()), columns=colunas)
+        df['categoria'] = df['categoria'].map(NOMES_CATEGORIA).astype('category')
+        return df
+
+    def carregar_dados(self, categoria=None):
+        if self.db is None: 
             return pd.DataFrame()
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM eventos", conn)
-        conn.close()
-        df.columns = df.columns.str.strip()
+        inicio = self.inicio_periodo()
+        if self.agregado:
+            return self.carregar_rollups(inicio, categoria)
+        # Lê mês a mês (só os do período; o roteador mantém no máximo MAX_ANEXADOS
+        # shards anexados). Período, categoria e coordenada válida filtram no SQL
+        if self.motor is not None:
+            df = self.motor.pontos(inicio, categoria)
+            return self.compactar(df) if not df.empty else pd.DataFrame()
+        filtro_cat = "AND categoria = ?" if categoria else ""
+        params = (inicio, CATEGORIAS[categoria]) if categoria else (inicio,)
+        partes = []
+        for mes in self.db.particoes.meses(inicio):
+            sql = (f"SELECT {COLUNAS_MAPA} FROM {self.db.particoes.anexar(mes)}.eventos "
+                   f"WHERE ts >= ? {filtro_cat} AND lat IS NOT NULL AND lat != 0")
+            for bloco in pd.read_sql_query(sql, self.db.conn, params=params, chunksize=LINHAS_POR_BLOCO):
+                partes.append(self.compactar(bloco))
+        if not partes:
+            return pd.DataFrame()
+        return pd.concat(partes, ignore_index=True)
+
+    @staticmethod
+    def compactar(df):
+        # Esquema v2: códigos e epoch ms; categoria decodificada como categórica,
+        # coordenadas e magnitude em float32
+        df['id'] = df['id'].astype('int32')
+        df['categoria'] = df['categoria'].map(NOMES_CATEGORIA).astype(TIPO_CATEGORIA)
+        df[['mag', 'lat', 'lon']] = df[['mag', 'lat', 'lon']].astype('float32')
+        df['peso'] = np.ones(len(df), dtype='int32')
+        return df
+
+    def com_detalhes(self, df):
+        # Completa eventos brutos (só colunas do mapa) com o texto e a data/hora
+        # exibidos; rollups já vêm com essas colunas
+        if 'id' not in df or self.db is None:
+            return df
+        chaves = list(zip(df['ts'].tolist(), df['id'].tolist()))
+        detalhes = self.db.buscar_detalhes(chaves)
+        texto = [detalhes.get(k, (None, None, None)) for k in chaves]
+        df = df.copy()
+        for i, coluna in enumerate(('tipo_orig', 'loc', 'escala_tecnica')):
+            df[coluna] = [t[i] for t in texto]
+        quando = pd.to_datetime(df['ts'], unit='ms', utc=True).dt.tz_convert(datetime.now().astimezone().tzinfo)
+        df['data'] = quando.dt.strftime('%Y-%m-%d')
+        df['hora'] = quando.dt.strftime('%H:%M')
+        return df
+
+    def carregar_rollups(self, inicio, categoria=None):
+        # Períodos longos: contagens diárias por célula (rollups + dias recentes
+        # agregados na hora), somadas no período; mesmas colunas que a tela usa
+        if self.motor is not None:
+            df = self.motor.celulas(inicio, categoria)
+        else:
+            linhas = self.db.agregar(inicio, categoria=categoria)
+            df = pd.DataFrame(linhas, columns=['dia', 'categoria', 'celula', 'faixa_mag', 'eventos', 'mag_max'])
+            df = df.groupby(['categoria', 'celula'], as_index=False).agg(
+                peso=('eventos', 'sum'), mag_max=('mag_max', 'max'), dia=('dia', 'max'))
+        if df.empty:
+            return pd.DataFrame()
+        centros = [centro_celula(c) or (0.0, 0.0) for c in df['celula']]
+        df['lat'] = [c[0] for c in centros]
+        df['lon'] = [c[1] for c in centros]
+        df['categoria'] = df['categoria'].map(NOMES_CATEGORIA).astype(TIPO_CATEGORIA)
+        df['loc'] = [f"Célula {la:+.1f}, {lo:+.1f}" if c >= 0 else "Sem coordenada"
+                     for c, la, lo in zip(df['celula'], df['lat'], df['lon'])]
+        df['tipo_orig'] = df['peso'].astype(str) + " evento(s)"
+        df['escala_tecnica'] = ["Mag. máx. " + f"{m:.1f}" if pd.notna(m) else "-" for m in df['mag_max']]
+        df['data'] = pd.to_datetime(df['dia'], unit='D').dt.strftime('%Y-%m-%d')
+        df['hora'] = ""
         return df
 
     def init_ui(self):
@@ -114,6 +358,18 @@ class AnaliseWindow(QMainWindow):
             filter_bar.addWidget(btn)
             self.btn_filtros[chave] = btn
         self.btn_filtros["Geral"].setChecked(True)
+
+        filter_bar.addSpacing(20)
+        self.btn_periodos = {}
+        for nome, dias in PERIODOS:
+            btn = QPushButton(nome)
+            btn.setCheckable(True)
+            btn.setStyleSheet("QPushButton { background: #282c34; border: 1px solid #d19a66; color: #d19a66; padding: 6px; border-radius: 4px; } "
+                              "QPushButton:checked { background: #d19a66; color: #1e2227; font-weight: bold; }")
+            btn.clicked.connect(lambda ch, d=dias: self.set_periodo(d))
+            filter_bar.addWidget(btn)
+            self.btn_periodos[dias] = btn
+        self.btn_periodos[self.periodo].setChecked(True)
         main_layout.addLayout(filter_bar)
 
         # CONTEÚDO PRINCIPAL
@@ -149,6 +405,10 @@ class AnaliseWindow(QMainWindow):
         det_layout.addWidget(self.txt_info)
         side_panel.addWidget(self.frame_detalhes)
 
+        self.lbl_resumo = QLabel()
+        self.lbl_resumo.setStyleSheet("font-weight: bold; color: #d19a66; padding: 4px;")
+        side_panel.addWidget(self.lbl_resumo)
+
         self.table = QTableWidget()
         self.configurar_tabela()
         side_panel.addWidget(self.table)
@@ -163,7 +423,7 @@ class AnaliseWindow(QMainWindow):
 
     def configurar_tabela(self):
         self.table.setColumnCount(2)
-        self.table.setHorizontalHeaderLabels(["Localização", "Freq %"])
+        self.table.setHorizontalHeaderLabels(["Região", "Freq %"])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.setStyleSheet("QTableWidget { background: #21252b; border: none; color: white; }")
 
@@ -173,10 +433,33 @@ class AnaliseWindow(QMainWindow):
         self.txt_info.clear()
         self.atualizar_view()
 
+    def set_periodo(self, dias):
+        self.periodo = dias
+        for d, btn in self.btn_periodos.items(): btn.setChecked(d == dias)
+        self.carregar_periodo()
+        self.txt_info.clear()
+        self.atualizar_view()
+
     def atualizar_view(self):
-        self.df_view = self.df_total if self.filtro_ativo == "Geral" else self.df_total[self.df_total['categoria'] == self.filtro_ativo]
+        self.df_view = self.dados_filtro(self.filtro_ativo)
         self.plotar_mapa()
         self.popular_tabela()
+        self.atualizar_resumo()
+
+    def cubo_filtrado(self):
+        c = self.df_cubo
+        return c if self.filtro_ativo == "Geral" else c[c['categoria'] == self.filtro_ativo]
+
+    def atualizar_resumo(self):
+        # Totais do filtro direto do cubo (independe da retenção e do tamanho do histórico)
+        c = self.cubo_filtrado()
+        total = int(c['eventos'].sum())
+        com_mag = c[c['faixa_mag'] >= 0]
+        texto = f"📊 {total} evento(s)"
+        if not com_mag.empty:
+            texto += (f" | mag. média {com_mag['mag_soma'].sum() / com_mag['eventos'].sum():.1f}"
+                      f" | M5+: {int(com_mag.loc[com_mag['faixa_mag'] >= 5, 'eventos'].sum())}")
+        self.lbl_resumo.setText(texto)
 
     def plotar_mapa(self):
         self.ax.clear()
@@ -194,17 +477,28 @@ class AnaliseWindow(QMainWindow):
             self.ax.grid(color='#2c313a', linestyle='--', alpha=0.3)
 
         self.ax.set_xlim(-180, 180); self.ax.set_ylim(-90, 90)
+        # ax.clear() recria os callbacks; reconecta a cada plotagem
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self.timer_regiao.start())
+        self.ax.callbacks.connect('ylim_changed', lambda ax: self.timer_regiao.start())
 
         if not self.df_view.empty:
             df_plot = self.df_view[self.df_view['lat'] != 0].copy()
             if not df_plot.empty:
+                tamanho = 20 + 15 * np.log1p(df_plot['peso']) if self.agregado else 40
                 self.points = self.ax.scatter(df_plot['lon'], df_plot['lat'], 
-                                              c='#61afef', alpha=0.6, s=40, 
+                                              c='#61afef', alpha=0.6, s=tamanho, 
                                               edgecolors='white', picker=5)
                 self.current_plot_data = df_plot 
             
-            ia = IAEngine(self.df_view)
-            self.hotspots_info = ia.calcular_hotspots()
+            if self.filtro_ativo not in self.cache_hotspots:
+                entrada = self.df_view
+                if self.motor is not None and not self.agregado:
+                    cat_db = None if self.filtro_ativo == "Geral" else self.filtro_ativo
+                    entrada = self.motor.grade(self.inicio_periodo(), cat_db)
+                elif not self.agregado:
+                    entrada = agrupar_grade(self.df_view)
+                self.cache_hotspots[self.filtro_ativo] = IAEngine(entrada).calcular_hotspots()
+            self.hotspots_info = self.cache_hotspots[self.filtro_ativo]
             
             if len(self.hotspots_info) > 0:
                 lats = [h['lat'] for h in self.hotspots_info]
@@ -213,14 +507,15 @@ class AnaliseWindow(QMainWindow):
                                                      c='#e06c75', s=250, marker='X', 
                                                      edgecolors='white', picker=10)
         
-        self.ax.set_title(f"Padrões Detectados: {self.filtro_ativo.upper()}", color='#61afef')
+        resumo = " (resumo diário)" if self.agregado else ""
+        self.ax.set_title(f"Padrões Detectados: {self.filtro_ativo.upper()}{resumo}", color='#61afef')
         self.canvas.draw()
 
     def on_pick(self, event):
         # Clique em Ponto Azul (Histórico)
         if hasattr(self, 'points') and event.artist == self.points:
             idx = event.ind[0]
-            row = self.current_plot_data.iloc[idx]
+            row = self.com_detalhes(self.current_plot_data.iloc[[idx]]).iloc[0]
             msg = (f"<b style='color:#61afef;'>📊 REGISTRO HISTÓRICO</b><br><br>"
                    f"<b>TIPO:</b> {row.get('tipo_orig', 'Evento')}<br>"
                    f"<b>LOCAL:</b> {row.get('loc', 'N/A')}<br>"
@@ -243,6 +538,16 @@ class AnaliseWindow(QMainWindow):
                    f"<b>CATEGORIA:</b> {cat}<br>"
                    f"<b>IMPACTO PREVISTO:</b> {impacto}<br>"
                    f"<b>COORDENADAS:</b> {dados['lat']:.2f}, {dados['lon']:.2f}")
+            if self.agregado:
+                # Rollups: soma as células cujo centro está no raio
+                v = self.df_view[self.df_view['celula'] >= 0]
+                dist = [distancia_km(dados['lat'], dados['lon'], la, lo) for la, lo in zip(v['lat'], v['lon'])]
+                msg += f"<br><b>EVENTOS NUM RAIO DE {RAIO_ZONA_KM} KM:</b> {int(v['peso'][np.array(dist) <= RAIO_ZONA_KM].sum())}"
+            elif self.db is not None:
+                cat_db = None if self.filtro_ativo == "Geral" else self.filtro_ativo
+                inicio = self.inicio_periodo()
+                proximos = self.db.buscar_raio(dados['lat'], dados['lon'], RAIO_ZONA_KM, cat_db, inicio=inicio)
+                msg += f"<br><b>EVENTOS NUM RAIO DE {RAIO_ZONA_KM} KM:</b> {len(proximos)}"
             self.txt_info.setHtml(msg)
 
     def toggle_blink(self):
@@ -251,10 +556,40 @@ class AnaliseWindow(QMainWindow):
             self.cluster_marks.set_visible(self.blink_status)
             self.canvas.draw_idle()
 
-    def popular_tabela(self):
+    def atualizar_regiao(self):
+        # Tabela de frequências só com os eventos dentro da área visível do mapa,
+        # carregados pelo índice espacial em vez de filtrar o DataFrame inteiro
+        (lon_min, lon_max), (lat_min, lat_max) = self.ax.get_xlim(), self.ax.get_ylim()
+        if self.db is None or (lon_min <= -180 and lon_max >= 180 and lat_min <= -90 and lat_max >= 90):
+            self.popular_tabela()
+            return
+        if self.agregado:
+            # Rollups já estão em memória (uma linha por célula)
+            v = self.df_view
+            self.popular_tabela(v[v['lat'].between(lat_min, lat_max) & v['lon'].between(lon_min, lon_max)])
+            return
+        cat_db = None if self.filtro_ativo == "Geral" else self.filtro_ativo
+        inicio = self.inicio_periodo()
+        rows = self.db.buscar_bbox(max(lat_min, -90), min(lat_max, 90), max(lon_min, -180), min(lon_max, 180), cat_db,
+                                   inicio=inicio)
+        df = pd.DataFrame(rows, columns=LeitorDB.COLUNAS_GEO)
+        df['peso'] = 1
+        df['regiao'] = df['loc'].map(regiao_de)
+        self.popular_tabela(df)
+
+    def popular_tabela(self, df=None):
+        # Sem df: mapa inteiro, frequências por região somadas no cubo. Com df
+        # (área visível): eventos da busca espacial, ou células dos rollups
+        if df is None:
+            pesos = self.cubo_filtrado().groupby('regiao')['eventos'].sum()
+        elif not df.empty:
+            pesos = df.groupby('regiao' if 'regiao' in df else 'loc')['peso'].sum()
+        else:
+            pesos = pd.Series(dtype=float)
         self.table.setRowCount(0)
-        if not self.df_view.empty:
-            counts = self.df_view['loc'].value_counts(normalize=True).head(12) * 100
+        pesos = pesos[pesos > 0].sort_values(ascending=False)
+        if not pesos.empty:
+            counts = (pesos / pesos.sum()).head(TOP_REGIOES) * 100
             self.table.setRowCount(len(counts))
             for i, (loc, prob) in enumerate(counts.items()):
                 self.table.setItem(i, 0, QTableWidgetItem(str(loc)[:28]))
@@ -264,7 +599,7 @@ class AnaliseWindow(QMainWindow):
         path, _ = QFileDialog.getSaveFileName(self, "Salvar Como", "", "Excel (*.xlsx);;PDF (*.pdf)")
         if path:
             if path.endswith('.xlsx'):
-                self.df_view.to_excel(path, index=False)
+                self.com_detalhes(self.df_view).to_excel(path, index=False)
                 QMessageBox.information(self, "OK", "Excel exportado!")
             else:
                 self.exportar_pdf(path)
@@ -276,7 +611,7 @@ class AnaliseWindow(QMainWindow):
         c.setFont("Helvetica", 10)
         c.drawString(50, 730, f"Data: {datetime.now().strftime('%d/%m/%Y')}")
         y = 680
-        for i, row in self.df_view.head(25).iterrows():
+        for i, row in self.com_detalhes(self.df_view.head(25)).iterrows():
             c.drawString(50, y, f"- {row['tipo_orig']} em {row['loc'][:45]}")
             y -= 20
         c.save()
@@ -0,0 +1,1076 @@
+import sqlite3
+import hashlib
+import math
+import os
+import queue
+import re
+import stat
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.request import pathname2url
+
+# --- CONFIGURAÇÕES DO BANCO ---
+DB_PATH = "historico_v5.db"
+# Pragmas por conexão. WAL permite leitores simultâneos ao escritor; com WAL,
+# synchronous=NORMAL só arrisca a última transação numa queda de energia
+CACHE_KB = 64 * 1024
+MMAP_BYTES = 256 * 1024 * 1024
+BUSY_TIMEOUT_MS = 5000
+# Group commit do escritor em segundo plano
+LOTE_MAX_EVENTOS = 5000
+LOTE_MAX_ESPERA_S = 1.0
+# Lote recusado pelo banco (ex.: lock ocupado): regravado com backoff até o máximo
+ESPERA_RETENTATIVA_BD_S = 2.0
+ESPERA_RETENTATIVA_BD_MAX_S = 60.0
+# Raio médio da Terra para as buscas por distância (haversine)
+RAIO_TERRA_KM = 6371.0
+# Linhas copiadas por transação na migração v1 -> v2
+MIGRACAO_LOTE = 50000
+# Partições mensais (um arquivo SQLite por mês UTC, ao lado do banco principal).
+# O SQLite aceita até 10 ATTACH por conexão; os shards entram e saem sob demanda
+DIR_PARTICOES = "particoes"
+MAX_ANEXADOS = 8
+# Mês atual e anteriores que ainda recebem revisões; os mais antigos são selados
+MESES_ABERTOS = 2
+
+# --- CÓDIGOS DO ESQUEMA ---
+# Categoria e níveis são gravados como inteiros pequenos. Os níveis são
+# ordinais (comparáveis direto no SQL ou no pandas: nivel_impacto >= 4).
+CATEGORIAS = {"sismo": 1, "tsunami": 2, "vulcao": 3, "solar": 4, "clima": 5}
+NIVEIS = {"Muito Baixo": 1, "Baixo": 2, "Médio": 3, "Alto": 4, "Muito Alto": 5}
+RISCOS = {"Sem Risco": 0, "Baixo Risco": 1, "Médio Risco": 2, "Alto Risco": 3}
+NOMES_CATEGORIA = {v: k for k, v in CATEGORIAS.items()}
+NOMES_NIVEL = {v: k for k, v in NIVEIS.items()}
+NOMES_RISCO = {v: k for k, v in RISCOS.items()}
+
+# --- RETENÇÃO E ROLLUPS ---
+# Dias de eventos brutos guardados por categoria (None = para sempre). Eventos
+# com magnitude >= PRESERVAR_MAG ou nível >= PRESERVAR_NIVEL nunca são removidos.
+RETENCAO_DIAS = {"sismo": 365, "tsunami": None, "vulcao": None, "solar": 180, "clima": 365}
+PRESERVAR_MAG = 5.0
+PRESERVAR_NIVEL = NIVEIS["Alto"]
+# Um dia só é resumido depois desse prazo, quando a origem já não revisa os eventos
+CONSOLIDAR_APOS_DIAS = 7
+# Grade dos rollups (graus por célula)
+CELULA_GRAUS = 1.0
+MS_DIA = 86400000
+# Intervalo entre execuções da manutenção no escritor
+MANUTENCAO_INTERVALO_S = 24 * 3600
+
+# Resumo por dia x categoria x célula x faixa de magnitude (parte inteira;
+# -1 = sem magnitude). Célula -1 = sem coordenada. Usado tanto para gerar os
+# rollups quanto para agregar, na hora, os dias ainda não consolidados
+_COLUNAS_GRADE = int(360 / CELULA_GRAUS)
+_LINHAS_GRADE = int(180 / CELULA_GRAUS)
+SQL_FAIXA_MAG = "CASE WHEN mag IS NULL THEN -1 WHEN mag < 0 THEN 0 ELSE CAST(mag AS INTEGER) END"
+SQL_AGREGADO = f"""
+    SELECT ts / {MS_DIA} AS dia, categoria,
+           CASE WHEN lat IS NULL OR lon IS NULL OR (lat = 0 AND lon = 0) THEN -1
+                ELSE min(CAST((lat + 90) / {CELULA_GRAUS} AS INTEGER), {_LINHAS_GRADE - 1}) * {_COLUNAS_GRADE}
+                     + min(CAST((lon + 180) / {CELULA_GRAUS} AS INTEGER), {_COLUNAS_GRADE - 1}) END AS celula,
+           {SQL_FAIXA_MAG} AS faixa_mag,
+           COUNT(*) AS eventos, MAX(mag) AS mag_max
+    FROM {{s}}.eventos
+    WHERE ts >= ? AND ts < ? {{filtro}}
+    GROUP BY 1, 2, 3, 4
+"""
+
+# Cubo de estatísticas (categoria x região x dia x faixa de magnitude) mantido
+# pelo escritor a cada lote. Responde aos filtros e tabelas do analisador
+# somando células, sem varrer eventos. Como os rollups, não diminui com a retenção
+SQL_CUBO = f"""
+    SELECT ts / {MS_DIA} AS dia, categoria, regiao_de(loc) AS regiao, {SQL_FAIXA_MAG} AS faixa_mag,
+           COUNT(*) AS eventos, TOTAL(mag) AS mag_soma
+    FROM {{s}}.eventos
+    GROUP BY 1, 2, 3, 4
+"""
+SQL_CUBO_SOMAR = """
+    INSERT INTO cubo (dia, categoria, regiao, faixa_mag, eventos, mag_soma) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (dia, categoria, regiao, faixa_mag) DO UPDATE SET
+        eventos = eventos + excluded.eventos, mag_soma = mag_soma + excluded.mag_soma
+"""
+
+# Variação de rollup para um dia já consolidado: soma a contagem e mantém o
+# máximo (uma revisão que tira o evento da célula não reduz o mag_max)
+SQL_ROLLUP_SOMAR = """
+    INSERT INTO rollup_diario (dia, categoria, celula, faixa_mag, eventos, mag_max) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (dia, categoria, celula, faixa_mag) DO UPDATE SET
+        eventos = eventos + excluded.eventos,
+        mag_max = max(IFNULL(mag_max, excluded.mag_max), IFNULL(excluded.mag_max, mag_max))
+"""
+
+def faixa_mag(mag):
+    # Mesma regra de SQL_FAIXA_MAG
+    if mag is None:
+        return -1
+    return 0 if mag < 0 else int(mag)
+
+def regiao_de(loc):
+    # Região do cubo: o trecho depois da última vírgula ("10 km SW of Hualien
+    # City, Taiwan" -> "Taiwan"); sem vírgula, o local inteiro
+    if not loc:
+        return "Desconhecida"
+    return loc.rsplit(",", 1)[-1].strip() or loc.strip()
+
+def celula_de(lat, lon):
+    # Mesma regra da célula em SQL_AGREGADO
+    if lat is None or lon is None or (lat == 0 and lon == 0):
+        return -1
+    return (min(int((lat + 90) / CELULA_GRAUS), _LINHAS_GRADE - 1) * _COLUNAS_GRADE
+            + min(int((lon + 180) / CELULA_GRAUS), _COLUNAS_GRADE - 1))
+
+def centro_celula(celula):
+    # Célula da grade -> (lat, lon) do centro; None para -1
+    if celula < 0:
+        return None
+    linha, coluna = divmod(celula, _COLUNAS_GRADE)
+    return -90 + (linha + 0.5) * CELULA_GRAUS, -180 + (coluna + 0.5) * CELULA_GRAUS
+
+def intervalo_dia(data):
+    # "AAAA-MM-DD" (dia local) -> [início, fim) em epoch ms
+    inicio = datetime.strptime(data, "%Y-%m-%d")
+    return int(inicio.timestamp() * 1000), int((inicio + timedelta(days=1)).timestamp() * 1000)
+
+def mes_de(ts):
+    # epoch ms -> "AAAA-MM" (UTC), a chave da partição
+    return datetime.fromtimestamp(ts / 1000, timezone.utc).strftime("%Y-%m")
+
+def limites_mes(mes):
+    # "AAAA-MM" -> [início, fim) em epoch ms
+    ano, m = map(int, mes.split("-"))
+    inicio = datetime(ano, m, 1, tzinfo=timezone.utc)
+    fim = datetime(ano + m // 12, m % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(inicio.timestamp() * 1000), int(fim.timestamp() * 1000)
+
+# --- CONEXÕES ---
+
+def _aplicar_pragmas(conn):
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+def conectar_escrita(caminho=DB_PATH):
+    conn = sqlite3.connect(caminho, timeout=BUSY_TIMEOUT_MS / 1000)
+    # journal_mode=WAL é persistente no arquivo; basta o escritor ativá-lo
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    _aplicar_pragmas(conn)
+    return conn
+
+def conectar_leitura(caminho=DB_PATH, check_same_thread=True):
+    # Somente leitura: em WAL nunca bloqueia nem é bloqueada pelo escritor
+    conn = sqlite3.connect(f"file:{pathname2url(caminho)}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA query_only = 1")
+    _aplicar_pragmas(conn)
+    return conn
+
+# --- PARTIÇÕES MENSAIS ---
+# O banco principal guarda o catálogo (tabela particoes), as marcas d'água e o
+# progresso do backfill; os eventos ficam em particoes/eventos_AAAA-MM.db.
+# Cada shard tem a própria tabela eventos, índices e R*Tree, e é anexado
+# (ATTACH) como mAAAAMM só quando uma consulta ou gravação cai no seu mês.
+
+class Particoes:
+    def __init__(self, conn, caminho, somente_leitura=False):
+        self.conn = conn
+        self.diretorio = os.path.join(os.path.dirname(os.path.abspath(caminho)), DIR_PARTICOES)
+        self.somente_leitura = somente_leitura
+        # esquema -> mês, na ordem de uso (o primeiro é o próximo a sair)
+        self.anexados = OrderedDict()
+        if not somente_leitura:
+            os.makedirs(self.diretorio, exist_ok=True)
+
+    @staticmethod
+    def esquema(mes):
+        return "m" + mes.replace("-", "")
+
+    def arquivo(self, mes):
+        return os.path.join(self.diretorio, f"eventos_{mes}.db")
+
+    def anexar(self, mes):
+        esquema = self.esquema(mes)
+        if esquema in self.anexados:
+            self.anexados.move_to_end(esquema)
+            return esquema
+        while len(self.anexados) >= MAX_ANEXADOS:
+            self.desanexar(next(iter(self.anexados)))
+        arquivo = self.arquivo(mes)
+        if self.somente_leitura:
+            arquivo = f"file:{pathname2url(arquivo)}?mode=ro"
+        self.conn.execute(f"ATTACH DATABASE ? AS {esquema}", (arquivo,))
+        self.anexados[esquema] = mes
+        return esquema
+
+    def desanexar(self, esquema):
+        self.conn.execute(f"DETACH DATABASE {esquema}")
+        del self.anexados[esquema]
+
+    def meses(self, inicio=None, fim=None):
+        # Roteamento: só os meses do catálogo que se sobrepõem a [inicio, fim),
+        # do mais recente para o mais antigo
+        return [mes for (mes,) in self.conn.execute("""
+            SELECT mes FROM particoes
+            WHERE (? IS NULL OR fim > ?) AND (? IS NULL OR inicio < ?)
+            ORDER BY mes DESC
+        """, (inicio, inicio, fim, fim))]
+
+    def consultar(self, sql, params=(), inicio=None, fim=None):
+        # Executa sql em cada shard do intervalo ({s} = esquema do shard). Como as
+        # partições são disjuntas no tempo, "ORDER BY ts DESC" por shard já sai
+        # em ordem global
+        for mes in self.meses(inicio, fim):
+            yield from self.conn.execute(sql.format(s=self.anexar(mes)), params).fetchall()
+
+# --- GERENCIADOR DE BANCO DE DADOS (ESCRITA E ESQUEMA) ---
+# Só existe uma conexão de escrita por processo (a do EscritorLote); as demais
+# instâncias servem para criar/migrar o esquema na inicialização e para o backfill.
+
+class DBManager:
+    # Versão do esquema gravada em PRAGMA user_version
+    VERSAO_ESQUEMA = 3
+
+    # v2: tipos numéricos. ts/atualizado em epoch ms inteiro (data e hora saem
+    # de ts), magnitude e profundidade numéricas, categoria e níveis codificados.
+    # v3: a mesma tabela, uma por partição mensal
+    SQL_TABELA_EVENTOS = """
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY,
+            uid TEXT NOT NULL UNIQUE,
+            ts INTEGER NOT NULL,
+            atualizado INTEGER NOT NULL,
+            categoria INTEGER NOT NULL,
+            mag REAL,
+            profundidade_km REAL,
+            lat REAL, lon REAL,
+            nivel_impacto INTEGER,
+            risco_vitimas INTEGER,
+            tipo_orig TEXT,
+            loc TEXT,
+            escala_tecnica TEXT,
+            tipo_impacto TEXT
+        )
+    """
+
+    # v1 (texto); só usado para compactar bancos anteriores ao uid
+    SQL_TABELA_EVENTOS_V1 = """
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL, 
+            tipo_orig TEXT, 
+            loc TEXT, 
+            lat REAL, lon REAL, 
+            categoria TEXT,
+            escala_tecnica TEXT,
+            tipo_impacto TEXT,
+            nivel_impacto TEXT,
+            risco_vitimas TEXT,
+            hora TEXT, data TEXT,
+            atualizado REAL,
+            uid TEXT UNIQUE
+        )
+    """
+
+    def __init__(self, caminho=DB_PATH):
+        self.conn = conectar_escrita(caminho)
+        self.particoes = Particoes(self.conn, caminho)
+        self.create_table()
+        self.migrar()
+        self.construir_cubo()
+        self.selar_particoes()
+
+    def create_table(self):
+        cursor = self.conn.cursor()
+        legado = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'eventos'").fetchone() is not None
+        if not legado and cursor.execute("PRAGMA user_version").fetchone()[0] == 0:
+            # Banco novo: os eventos só existem nas partições
+            cursor.execute(f"PRAGMA user_version = {self.VERSAO_ESQUEMA}")
+        if legado:
+            # Bancos anteriores ao uid não têm a coluna de revisão (USGS "updated")
+            colunas = [c[1] for c in cursor.execute("PRAGMA table_info(eventos)")]
+            if "atualizado" not in colunas:
+                cursor.execute("ALTER TABLE eventos ADD COLUMN atualizado REAL")
+                cursor.execute("UPDATE eventos SET atualizado = ts")
+        # Marca d'água por categoria: maior ts e maior revisão já ingeridos
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS marcas_agua (
+                categoria TEXT PRIMARY KEY,
+                ts REAL,
+                atualizado REAL
+            )
+        """)
+        # Catálogo das partições: intervalo [inicio, fim) em epoch ms, se o
+        # arquivo já foi selado (somente leitura) e até onde os dias já têm rollup
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS particoes (
+                mes TEXT PRIMARY KEY,
+                inicio INTEGER,
+                fim INTEGER,
+                selada INTEGER DEFAULT 0,
+                consolidado_ate INTEGER
+            )
+        """)
+        if "consolidado_ate" not in [c[1] for c in cursor.execute("PRAGMA table_info(particoes)")]:
+            cursor.execute("ALTER TABLE particoes ADD COLUMN consolidado_ate INTEGER")
+        # Rollups permanentes (ver SQL_AGREGADO); ficam no principal, fora das partições
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_diario (
+                dia INTEGER,
+                categoria INTEGER,
+                celula INTEGER,
+                faixa_mag INTEGER,
+                eventos INTEGER,
+                mag_max REAL,
+                PRIMARY KEY (dia, categoria, celula, faixa_mag)
+            ) WITHOUT ROWID
+        """)
+        # Cubo de estatísticas (ver SQL_CUBO). mag_soma (e não máximo) para que
+        # uma revisão possa tirar o evento da célula antiga
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cubo (
+                dia INTEGER,
+                categoria INTEGER,
+                regiao TEXT,
+                faixa_mag INTEGER,
+                eventos INTEGER,
+                mag_soma REAL,
+                PRIMARY KEY (dia, categoria, regiao, faixa_mag)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    # Índices gerenciados de cada partição (nome -> colunas): criados/recriados
+    # quando o shard é aberto para escrita; qualquer outro índice idx_* em
+    # eventos que não esteja aqui é removido
+    INDICES = {
+        # Histórico por dia (intervalo de ts): busca, ordenação e colunas
+        # exibidas saem do índice (covering); serve também a filtros categoria + tempo
+        "idx_eventos_historico": "categoria, ts DESC, loc, escala_tecnica",
+    }
+
+    def migrar(self):
+        versao = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if versao < 1:
+            self._migrar_v1()
+        if versao < 2:
+            self._migrar_v2()
+        if versao < 3:
+            self._migrar_v3()
+
+    def sincronizar_indices(self, esquema):
+        # O sqlite_master guarda o CREATE sem o prefixo do esquema
+        normalizar = lambda sql: " ".join(sql.split())
+        esperado = {nome: f"CREATE INDEX {nome} ON eventos ({colunas})" for nome, colunas in self.INDICES.items()}
+        existentes = dict(self.conn.execute(
+            f"SELECT name, sql FROM {esquema}.sqlite_master WHERE type = 'index' AND tbl_name = 'eventos' AND name LIKE 'idx_%'"))
+        alterou = False
+        with self.conn:
+            for nome, sql in existentes.items():
+                if nome not in esperado or normalizar(sql) != normalizar(esperado[nome]):
+                    self.conn.execute(f"DROP INDEX {esquema}.{nome}")
+                    existentes[nome] = None
+            for nome, colunas in self.INDICES.items():
+                if existentes.get(nome) is None:
+                    self.conn.execute(f"CREATE INDEX {esquema}.{nome} ON eventos ({colunas})")
+                    alterou = True
+        if alterou:
+            # Estatísticas para o planejador escolher os índices novos
+            self.conn.execute(f"ANALYZE {esquema}")
+
+    # Índice espacial R*Tree (um ponto = caixa degenerada), mantido por triggers
+    # a partir de eventos, um por partição. (0, 0) é o "sem coordenada" dos
+    # serviços e fica de fora. O corpo dos triggers resolve os nomes no próprio shard.
+    SQL_GEO = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {s}.eventos_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+        """CREATE TRIGGER IF NOT EXISTS {s}.eventos_geo_ins AFTER INSERT ON eventos
+           WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL AND NOT (NEW.lat = 0 AND NEW.lon = 0)
+           BEGIN
+               INSERT INTO eventos_geo VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS {s}.eventos_geo_upd AFTER UPDATE OF lat, lon ON eventos
+           WHEN OLD.lat IS NOT NEW.lat OR OLD.lon IS NOT NEW.lon
+           BEGIN
+               DELETE FROM eventos_geo WHERE id = OLD.id;
+               INSERT INTO eventos_geo SELECT NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon
+               WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL AND NOT (NEW.lat = 0 AND NEW.lon = 0);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS {s}.eventos_geo_del AFTER DELETE ON eventos
+           BEGIN
+               DELETE FROM eventos_geo WHERE id = OLD.id;
+           END""",
+    ]
+
+    def sincronizar_geo(self, esquema):
+        novo = self.conn.execute(f"SELECT 1 FROM {esquema}.sqlite_master WHERE name = 'eventos_geo'").fetchone() is None
+        with self.conn:
+            for sql in self.SQL_GEO:
+                self.conn.execute(sql.format(s=esquema))
+            if novo:
+                self.conn.execute(f"""
+                    INSERT INTO {esquema}.eventos_geo
+                    SELECT id, lat, lat, lon, lon FROM {esquema}.eventos
+                    WHERE lat IS NOT NULL AND lon IS NOT NULL AND NOT (lat = 0 AND lon = 0)
+                """)
+
+    def particao(self, mes):
+        # Anexa o shard do mês para escrita, criando-o (ou reabrindo-o, se já
+        # selado: ex. backfill de um mês antigo) quando necessário
+        esquema = self.particoes.esquema(mes)
+        if esquema in self.particoes.anexados:
+            return self.particoes.anexar(mes)
+        linha = self.conn.execute("SELECT selada FROM particoes WHERE mes = ?", (mes,)).fetchone()
+        if linha and linha[0]:
+            print(f"Reabrindo partição selada {mes}...")
+            os.chmod(self.particoes.arquivo(mes), stat.S_IREAD | stat.S_IWRITE)
+        esquema = self.particoes.anexar(mes)
+        try:
+            if linha is None:
+                # Precisa vir antes da primeira tabela; permite devolver páginas
+                # livres após a retenção sem um VACUUM completo
+                self.conn.execute(f"PRAGMA {esquema}.auto_vacuum = INCREMENTAL")
+            if linha is None or linha[0]:
+                self.conn.execute(f"PRAGMA {esquema}.journal_mode = WAL")
+                self.conn.execute(f"PRAGMA {esquema}.synchronous = NORMAL")
+                with self.conn:
+                    self.conn.execute(self.SQL_TABELA_EVENTOS.format(nome=f"{esquema}.eventos"))
+                self.sincronizar_geo(esquema)
+                inicio, fim = limites_mes(mes)
+                with self.conn:
+                    self.conn.execute("""
+                        INSERT INTO particoes (mes, inicio, fim, selada) VALUES (?, ?, ?, 0)
+                        ON CONFLICT(mes) DO UPDATE SET selada = 0
+                    """, (mes, inicio, fim))
+            self.sincronizar_indices(esquema)
+        except sqlite3.Error:
+            # Preparação interrompida (ex.: lock ocupado): desanexa para que a
+            # próxima chamada refaça tudo, em vez de achar o shard já pronto
+            self.particoes.desanexar(esquema)
+            raise
+        return esquema
+
+    def selar_particoes(self):
+        # Meses fora dos MESES_ABERTOS mais recentes viram um arquivo único,
+        # compacto e somente leitura (sem -wal/-shm): pronto para backup/arquivo
+        agora = datetime.now(timezone.utc)
+        n = agora.year * 12 + agora.month - 1 - (MESES_ABERTOS - 1)
+        limite = f"{n // 12:04d}-{n % 12 + 1:02d}"
+        for (mes,) in self.conn.execute("SELECT mes FROM particoes WHERE selada = 0 AND mes < ?", (limite,)).fetchall():
+            try:
+                esquema = self.particao(mes)
+                self.conn.execute(f"ANALYZE {esquema}")
+                self.conn.execute(f"VACUUM {esquema}")
+                self.conn.execute(f"PRAGMA {esquema}.journal_mode = DELETE")
+                self.particoes.desanexar(esquema)
+                os.chmod(self.particoes.arquivo(mes), stat.S_IREAD)
+                with self.conn:
+                    self.conn.execute("UPDATE particoes SET selada = 1 WHERE mes = ?", (mes,))
+                print(f"Partição {mes} selada")
+            except sqlite3.Error as e:
+                print(f"Erro ao selar partição {mes}: {e}")
+
+    @staticmethod
+    def _uid_legado(categoria, ts, loc, titulo, escala, data):
+        # Identidade possível para linhas anteriores ao uid: sismos/tsunamis da
+        # USGS já eram únicos por (ts, loc); vulcão, solar e clima eram regravados
+        # a cada ciclo com datetime.now(), então colapsam num registro por dia
+        if categoria in ("sismo", "tsunami"):
+            chave = f"{categoria}|{ts}|{loc}"
+        else:
+            chave = f"{categoria}|{loc}|{titulo}|{escala}|{data}"
+        return "v1:" + hashlib.sha1(chave.encode("utf-8")).hexdigest()
+
+    def _migrar_v1(self):
+        # Compactação única: atribui uid às linhas antigas, colapsa as duplicatas
+        # (mantém a primeira ocorrência) e recria a tabela sem UNIQUE(ts, loc)
+        print("Migrando banco: identidade estável de eventos e compactação de duplicatas...")
+        self.conn.create_function("uid_legado", 6, self._uid_legado, deterministic=True)
+        antes = self.conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS eventos_compacto")
+            self.conn.execute(self.SQL_TABELA_EVENTOS_V1.format(nome="eventos_compacto"))
+            self.conn.execute("""
+                INSERT INTO eventos_compacto
+                SELECT id, ts, tipo_orig, loc, lat, lon, categoria, escala_tecnica, tipo_impacto,
+                       nivel_impacto, risco_vitimas, hora, data, atualizado, uid
+                FROM (SELECT *, uid_legado(categoria, ts, loc, tipo_orig, escala_tecnica, data) AS uid,
+                             ROW_NUMBER() OVER (PARTITION BY uid_legado(categoria, ts, loc, tipo_orig, escala_tecnica, data)
+                                                ORDER BY id) AS n
+                      FROM eventos)
+                WHERE n = 1
+            """)
+            self.conn.execute("DROP TABLE eventos")
+            self.conn.execute("ALTER TABLE eventos_compacto RENAME TO eventos")
+            self.conn.execute("PRAGMA user_version = 1")
+        depois = self.conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+        # Devolve ao sistema o espaço das duplicatas removidas
+        self.conn.execute("VACUUM")
+        print(f"Migração concluída: {antes} -> {depois} linha(s)")
+
+    RE_MAG_V1 = re.compile(r"Richter\s+(-?\d+(?:\.\d+)?)|(-?\d+(?:\.\d+)?)\s+Richter")
+
+    @staticmethod
+    def _mag_v1(escala, titulo):
+        # No v1 a magnitude só existe no texto ("Richter 4.5" / "... - 4.5 Richter")
+        for texto in (escala, titulo):
+            m = DBManager.RE_MAG_V1.search(texto or "")
+            if m:
+                return float(m.group(1) or m.group(2))
+        return None
+
+    # Conversão de uma linha v1 para v2 (o id é mantido: o R*Tree continua válido).
+    # A profundidade não era gravada no v1 e fica nula nas linhas antigas.
+    SQL_COPIA_V2 = """
+        INSERT OR REPLACE INTO eventos_v2
+        (id, uid, ts, atualizado, categoria, mag, profundidade_km, lat, lon,
+         nivel_impacto, risco_vitimas, tipo_orig, loc, escala_tecnica, tipo_impacto)
+        SELECT id, uid, CAST(ROUND(ts) AS INTEGER), CAST(ROUND(IFNULL(atualizado, ts)) AS INTEGER),
+               cod_categoria(categoria), mag_v1(escala_tecnica, tipo_orig), NULL, lat, lon,
+               cod_nivel(nivel_impacto), cod_risco(risco_vitimas), tipo_orig, loc, escala_tecnica, tipo_impacto
+        FROM eventos
+    """
+
+    def _migrar_v2(self):
+        # Migração online: cópia em lotes curtos, cada um na sua transação (leitores
+        # em WAL seguem consultando o v1, e uma interrupção retoma do último id
+        # copiado). Gravações de outros processos no v1 durante a cópia são
+        # registradas por triggers e reaplicadas na troca final, que é a única
+        # transação que segura o lock de escrita.
+        print("Migrando banco para o esquema v2 (tipos numéricos)...")
+        c = self.conn
+        c.create_function("cod_categoria", 1, CATEGORIAS.get, deterministic=True)
+        c.create_function("cod_nivel", 1, NIVEIS.get, deterministic=True)
+        c.create_function("cod_risco", 1, RISCOS.get, deterministic=True)
+        c.create_function("mag_v1", 2, self._mag_v1, deterministic=True)
+        with c:
+            c.execute(self.SQL_TABELA_EVENTOS.format(nome="eventos_v2"))
+            c.execute("CREATE TABLE IF NOT EXISTS migracao_v2_pendentes (id INTEGER PRIMARY KEY)")
+            for nome, quando in (("ins", "AFTER INSERT"), ("upd", "AFTER UPDATE"), ("del", "AFTER DELETE")):
+                linha = "OLD" if nome == "del" else "NEW"
+                c.execute(f"""CREATE TRIGGER IF NOT EXISTS migracao_v2_{nome} {quando} ON eventos
+                              BEGIN INSERT OR IGNORE INTO migracao_v2_pendentes VALUES ({linha}.id); END""")
+        ultimo = c.execute("SELECT IFNULL(MAX(id), 0) FROM eventos_v2").fetchone()[0]
+        total = c.execute("SELECT COUNT(*) FROM eventos WHERE id > ?", (ultimo,)).fetchone()[0]
+        copiadas = 0
+        while True:
+            with c:
+                n = c.execute(self.SQL_COPIA_V2 + " WHERE id > ? ORDER BY id LIMIT ?", (ultimo, MIGRACAO_LOTE)).rowcount
+            if n <= 0:
+                break
+            ultimo = c.execute("SELECT MAX(id) FROM eventos_v2").fetchone()[0]
+            copiadas += n
+            print(f"  {copiadas}/{total} linha(s)")
+        # Troca: reaplica o que mudou durante a cópia e substitui a tabela
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("DELETE FROM eventos_v2 WHERE id IN (SELECT id FROM migracao_v2_pendentes)")
+            c.execute(self.SQL_COPIA_V2 + " WHERE id IN (SELECT id FROM migracao_v2_pendentes)")
+            c.execute("DROP TABLE eventos")
+            c.execute("DROP TABLE migracao_v2_pendentes")
+            c.execute("ALTER TABLE eventos_v2 RENAME TO eventos")
+            c.execute("PRAGMA user_version = 2")
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        print("Migração v2 concluída")
+
+    # --- MANUTENÇÃO: ROLLUPS, RETENÇÃO E VACUUM ---
+
+    def manutencao(self):
+        self.consolidar()
+        self.aplicar_retencao()
+        self.selar_particoes()
+
+    def consolidar(self):
+        # Gera o rollup dos dias completos mais antigos que CONSOLIDAR_APOS_DIAS
+        # ainda não resumidos. A leitura usa uma conexão própria e somente
+        # leitura no arquivo do shard, para não reabrir partições seladas.
+        # Um dia consolidado não é recalculado (a retenção já pode ter podado
+        # seus eventos brutos): o que chegar depois para ele (ex.: backfill
+        # sobreposto) é somado ao rollup por salvar_lote
+        horizonte = (int(time.time() * 1000) // MS_DIA - CONSOLIDAR_APOS_DIAS) * MS_DIA
+        pendentes = self.conn.execute("""
+            SELECT mes, IFNULL(consolidado_ate, inicio), min(fim, ?) FROM particoes
+            WHERE IFNULL(consolidado_ate, inicio) < min(fim, ?)
+            ORDER BY mes
+        """, (horizonte, horizonte)).fetchall()
+        for mes, de, ate in pendentes:
+            try:
+                with self.conn:
+                    # O lock de escrita impede que outro escritor (ex.: um backfill
+                    # em paralelo) grave no shard entre a leitura e o avanço de
+                    # consolidado_ate; o limite é relido já sob o lock
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    de = self.conn.execute("SELECT IFNULL(consolidado_ate, inicio) FROM particoes WHERE mes = ?",
+                                           (mes,)).fetchone()[0]
+                    if de >= ate:
+                        continue
+                    shard = conectar_leitura(self.particoes.arquivo(mes))
+                    linhas = shard.execute(SQL_AGREGADO.format(s="main", filtro=""), (de, ate)).fetchall()
+                    shard.close()
+                    self.conn.executemany("INSERT OR REPLACE INTO rollup_diario VALUES (?, ?, ?, ?, ?, ?)", linhas)
+                    self.conn.execute("UPDATE particoes SET consolidado_ate = ? WHERE mes = ?", (ate, mes))
+                print(f"Rollup {mes}: {len(linhas)} linha(s)")
+            except sqlite3.Error as e:
+                print(f"Erro ao consolidar partição {mes}: {e}")
+
+    def aplicar_retencao(self):
+        # Remove eventos brutos fora da janela da categoria, só em dias já
+        # consolidados e preservando os significativos. Partições seladas só
+        # são reabertas (e depois seladas de novo) se houver o que remover
+        agora = int(time.time() * 1000)
+        regras = [(CATEGORIAS[cat], agora - dias * MS_DIA) for cat, dias in RETENCAO_DIAS.items() if dias is not None]
+        if not regras:
+            return
+        filtro = " OR ".join("(categoria = ? AND ts < ?)" for _ in regras)
+        sql = f"""
+            FROM {{s}}.eventos
+            WHERE ts < ? AND ({filtro})
+              AND IFNULL(mag, 0) < ? AND IFNULL(nivel_impacto, 0) < ?
+        """
+        corte_max = max(corte for _, corte in regras)
+        meses = self.conn.execute("""
+            SELECT mes, consolidado_ate, selada FROM particoes
+            WHERE consolidado_ate IS NOT NULL AND inicio < ?
+            ORDER BY mes
+        """, (corte_max,)).fetchall()
+        for mes, consolidado_ate, selada in meses:
+            params = [consolidado_ate] + [x for regra in regras for x in regra] + [PRESERVAR_MAG, PRESERVAR_NIVEL]
+            try:
+                if selada:
+                    shard = conectar_leitura(self.particoes.arquivo(mes))
+                    existe = shard.execute("SELECT EXISTS (SELECT 1 " + sql.format(s="main") + ")", params).fetchone()[0]
+                    shard.close()
+                    if not existe:
+                        continue
+                esquema = self.particao(mes)
+                with self.conn:
+                    n = self.conn.execute("DELETE " + sql.format(s=esquema), params).rowcount
+                # Devolve as páginas liberadas ao sistema (shards criados com
+                # auto_vacuum=INCREMENTAL; os selados passam por VACUUM ao selar)
+                self.conn.execute(f"PRAGMA {esquema}.incremental_vacuum").fetchall()
+                print(f"Retenção {mes}: {n} evento(s) removido(s)")
+            except sqlite3.Error as e:
+                print(f"Erro na retenção da partição {mes}: {e}")
+
+    def construir_cubo(self):
+        # Carga inicial do cubo (banco anterior a ele, ou migrado de v1/v2) a
+        # partir dos eventos presentes nas partições; daí em diante salvar_lote o
+        # mantém. Dias já podados pela retenção ficam só nos rollups
+        if self.conn.execute("SELECT 1 FROM cubo LIMIT 1").fetchone():
+            return
+        meses = self.particoes.meses()
+        if not meses:
+            return
+        print("Construindo cubo de estatísticas...")
+        for mes in meses:
+            try:
+                shard = conectar_leitura(self.particoes.arquivo(mes))
+                shard.create_function("regiao_de", 1, regiao_de, deterministic=True)
+                linhas = shard.execute(SQL_CUBO.format(s="main")).fetchall()
+                shard.close()
+                with self.conn:
+                    self.conn.executemany(SQL_CUBO_SOMAR, linhas)
+            except sqlite3.Error as e:
+                print(f"Erro ao construir o cubo da partição {mes}: {e}")
+
+    def _migrar_v3(self):
+        # Move a tabela única para as partições, um mês por transação. Cada mês
+        # é copiado e apagado do principal na mesma transação; uma interrupção
+        # retoma pelos meses que restam (a cópia é idempotente pelo uid)
+        print("Migrando banco para partições mensais...")
+        c = self.conn
+        with c:
+            # O R*Tree e os índices do principal não servem mais; só atrasariam os DELETEs
+            for nome in ("eventos_geo_ins", "eventos_geo_upd", "eventos_geo_del"):
+                c.execute(f"DROP TRIGGER IF EXISTS main.{nome}")
+            c.execute("DROP TABLE IF EXISTS main.eventos_geo")
+            for (nome,) in c.execute("SELECT name FROM main.sqlite_master WHERE type = 'index' AND tbl_name = 'eventos' AND name LIKE 'idx_%'").fetchall():
+                c.execute(f"DROP INDEX main.{nome}")
+            c.execute("CREATE INDEX IF NOT EXISTS main.migracao_v3_ts ON eventos (ts)")
+        colunas = ("uid, ts, atualizado, categoria, mag, profundidade_km, lat, lon, "
+                   "nivel_impacto, risco_vitimas, tipo_orig, loc, escala_tecnica, tipo_impacto")
+        meses = [m for (m,) in c.execute("SELECT DISTINCT strftime('%Y-%m', ts / 1000, 'unixepoch') FROM main.eventos")]
+        for mes in meses:
+            esquema = self.particao(mes)
+            inicio, fim = limites_mes(mes)
+            with c:
+                n = c.execute(f"INSERT OR REPLACE INTO {esquema}.eventos ({colunas}) SELECT {colunas} FROM main.eventos "
+                              "WHERE ts >= ? AND ts < ?", (inicio, fim)).rowcount
+                c.execute("DELETE FROM main.eventos WHERE ts >= ? AND ts < ?", (inicio, fim))
+            print(f"  {mes}: {n} linha(s)")
+        with c:
+            c.execute("DROP TABLE main.eventos")
+            c.execute("PRAGMA main.user_version = 3")
+        # O principal fica só com catálogo, marcas e backfill
+        c.execute("VACUUM main")
+        print("Migração v3 concluída")
+
+    # Upsert pela identidade estável: uma revisão (ex.: magnitude corrigida)
+    # atualiza a linha existente em vez de criar outra. A identidade vale dentro
+    # do mês do evento (a partição é escolhida pelo ts)
+    SQL_UPSERT = """
+        INSERT INTO {s}.eventos 
+        (uid, ts, atualizado, categoria, mag, profundidade_km, lat, lon,
+         nivel_impacto, risco_vitimas, tipo_orig, loc, escala_tecnica, tipo_impacto)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(uid) DO UPDATE SET
+            ts = excluded.ts, atualizado = excluded.atualizado, categoria = excluded.categoria,
+            mag = excluded.mag, profundidade_km = excluded.profundidade_km,
+            lat = excluded.lat, lon = excluded.lon,
+            nivel_impacto = excluded.nivel_impacto, risco_vitimas = excluded.risco_vitimas,
+            tipo_orig = excluded.tipo_orig, loc = excluded.loc,
+            escala_tecnica = excluded.escala_tecnica, tipo_impacto = excluded.tipo_impacto
+        WHERE excluded.atualizado > eventos.atualizado
+    """
+
+    @staticmethod
+    def _params(ev):
+        return (ev.uid, int(round(ev.ts)), int(round(ev.atualizado)), CATEGORIAS[ev.categoria], ev.mag,
+                ev.prof_km, ev.lat, ev.lon, NIVEIS.get(ev.impacto_nivel), RISCOS.get(ev.risco_vitimas),
+                ev.titulo, ev.loc, ev.escala, ev.impacto_tipo)
+
+    def _adotar_legados(self, esquema, linhas):
+        # Linhas migradas do v1 têm uid sintético ("v1:..."); um evento que ainda
+        # estava no feed na atualização volta com o uid real. Em vez de gravá-lo
+        # de novo, a linha antiga (mesma categoria, ts e coordenadas) assume o
+        # uid real e o upsert segue como revisão dela. Shards sem linhas v1 saem
+        # na primeira consulta (faixa do índice único de uid)
+        if not self.conn.execute(f"SELECT EXISTS (SELECT 1 FROM {esquema}.eventos "
+                                 "WHERE uid >= 'v1:' AND uid < 'v1;')").fetchone()[0]:
+            return
+        novos = {p[0]: p for p in linhas if not p[0].startswith("v1:")}
+        uids = list(novos)
+        for i in range(0, len(uids), 900):
+            parte = uids[i:i + 900]
+            for (uid,) in self.conn.execute(f"SELECT uid FROM {esquema}.eventos "
+                                            f"WHERE uid IN ({','.join('?' * len(parte))})", parte):
+                del novos[uid]
+        for uid, p in novos.items():
+            legado = self.conn.execute(f"""
+                SELECT id FROM {esquema}.eventos
+                WHERE categoria = ? AND ts = ? AND lat IS ? AND lon IS ? AND uid >= 'v1:' AND uid < 'v1;'
+                LIMIT 1
+            """, (p[3], p[1], p[6], p[7])).fetchone()
+            if legado:
+                self.conn.execute(f"UPDATE {esquema}.eventos SET uid = ? WHERE id = ?", (uid, legado[0]))
+
+    def _deltas_lote(self, esquema, linhas, consolidado_ate):
+        # Variações do cubo causadas pelo upsert de linhas (tuplas de _params)
+        # no shard: +1 na célula de cada evento novo; numa revisão aceita
+        # (atualizado maior), -1 na célula antiga e +1 na nova. Repete a regra do
+        # SQL_UPSERT em memória, inclusive para uids repetidos dentro do lote.
+        # Eventos de dias já consolidados (ts < consolidado_ate) geram também as
+        # variações de rollup_diario, que consolidar não recalcula
+        atuais = {}
+        uids = list({p[0] for p in linhas})
+        for i in range(0, len(uids), 900):
+            parte = uids[i:i + 900]
+            for uid, ts, atualizado, categoria, mag, lat, lon, loc in self.conn.execute(
+                    f"SELECT uid, ts, atualizado, categoria, mag, lat, lon, loc FROM {esquema}.eventos "
+                    f"WHERE uid IN ({','.join('?' * len(parte))})", parte):
+                atuais[uid] = (ts, atualizado, categoria, mag, lat, lon, loc)
+        cubo = defaultdict(lambda: [0, 0.0])
+        rollup = defaultdict(lambda: [0, None])
+
+        def somar(linha, sinal):
+            ts, _, categoria, mag, lat, lon, loc = linha
+            d = cubo[(ts // MS_DIA, categoria, regiao_de(loc), faixa_mag(mag))]
+            d[0] += sinal
+            d[1] += sinal * (mag or 0.0)
+            if consolidado_ate is not None and ts < consolidado_ate:
+                r = rollup[(ts // MS_DIA, categoria, celula_de(lat, lon), faixa_mag(mag))]
+                r[0] += sinal
+                if sinal > 0 and mag is not None:
+                    r[1] = mag if r[1] is None else max(r[1], mag)
+
+        for p in linhas:
+            novo = (p[1], p[2], p[3], p[4], p[6], p[7], p[11])
+            antigo = atuais.get(p[0])
+            if antigo is not None:
+                if novo[1] <= antigo[1]:
+                    continue
+                somar(antigo, -1)
+            atuais[p[0]] = novo
+            somar(novo, 1)
+        return ([chave + tuple(d) for chave, d in cubo.items() if d[0] or d[1]],
+                [chave + tuple(r) for chave, r in rollup.items() if r[0] or r[1] is not None])
+
+    def salvar_lote(self, eventos, marcas=None, extra=None):
+        # Um executemany por partição, cada um numa transação (um fsync por
+        # shard do lote, não por linha) junto com as variações do cubo. Em WAL
+        # uma transação com vários bancos anexados não é atômica entre eles, então
+        # as marcas d'água e o "extra" (sql, params) do principal só são gravados
+        # depois dos eventos: uma queda no meio repete o lote (upsert idempotente),
+        # nunca o perde
+        por_mes = defaultdict(list)
+        for ev in eventos:
+            por_mes[mes_de(ev.ts)].append(ev)
+        for mes, evs in sorted(por_mes.items()):
+            esquema = self.particao(mes)
+            linhas = [self._params(ev) for ev in evs]
+            with self.conn:
+                # O lock de escrita vem antes da leitura das linhas atuais: outro
+                # escritor (ex.: backfill em outro processo) gravando o mesmo uid
+                # esperaria aqui, em vez de somar a mesma variação ao cubo
+                self.conn.execute("BEGIN IMMEDIATE")
+                consolidado_ate = self.conn.execute("SELECT consolidado_ate FROM particoes WHERE mes = ?",
+                                                    (mes,)).fetchone()[0]
+                self._adotar_legados(esquema, linhas)
+                cubo, rollup = self._deltas_lote(esquema, linhas, consolidado_ate)
+                self.conn.executemany(self.SQL_UPSERT.format(s=esquema), linhas)
+                self.conn.executemany(SQL_CUBO_SOMAR, cubo)
+                # Célula esvaziada por revisão (evento mudou de dia, região ou faixa): sai do cubo
+                self.conn.executemany(
+                    "DELETE FROM cubo WHERE dia = ? AND categoria = ? AND regiao = ? AND faixa_mag = ? AND eventos <= 0",
+                    [c[:4] for c in cubo if c[4] < 0])
+                if rollup:
+                    self.conn.executemany(SQL_ROLLUP_SOMAR, rollup)
+                    # Célula esvaziada por revisão: sai do rollup
+                    self.conn.executemany(
+                        "DELETE FROM rollup_diario WHERE dia = ? AND categoria = ? AND celula = ? AND faixa_mag = ? AND eventos <= 0",
+                        [r[:4] for r in rollup if r[4] < 0])
+        with self.conn:
+            if marcas:
+                self.conn.executemany("INSERT OR REPLACE INTO marcas_agua (categoria, ts, atualizado) VALUES (?, ?, ?)",
+                                      [(cat, ts, atualizado) for cat, (ts, atualizado) in marcas.items()])
+            if extra:
+                self.conn.execute(*extra)
+
+# --- ESCRITA EM LOTE (GROUP COMMIT) ---
+# Thread dona da conexão de escrita. Acumula os lotes recebidos e grava tudo
+# de uma vez (uma transação por partição tocada) quando atinge LOTE_MAX_EVENTOS ou quando o lote mais
+# antigo espera há LOTE_MAX_ESPERA_S, o que vier primeiro.
+
+class EscritorLote:
+    def __init__(self, caminho=DB_PATH):
+        self.caminho = caminho
+        self.fila = queue.Queue()
+        self.thread = threading.Thread(target=self._executar, name="escritor-db", daemon=True)
+        self.thread.start()
+
+    def enfileirar(self, eventos, marcas=None):
+        self.fila.put((eventos, marcas or {}))
+
+    def encerrar(self):
+        # Grava o que estiver pendente e finaliza a thread
+        self.fila.put(None)
+        self.thread.join(timeout=10)
+
+    def _executar(self):
+        db = DBManager(self.caminho)
+        proxima_manutencao = time.monotonic()
+        espera = 0.0
+        ativo = True
+        while ativo:
+            # Rollups/retenção rodam nesta thread (dona da conexão de escrita),
+            # entre lotes; o que chegar enquanto isso espera na fila
+            if time.monotonic() >= proxima_manutencao:
+                try:
+                    db.manutencao()
+                except Exception as e:
+                    print(f"Erro na manutenção do histórico: {e}")
+                proxima_manutencao = time.monotonic() + MANUTENCAO_INTERVALO_S
+            try:
+                item = self.fila.get(timeout=max(0.0, proxima_manutencao - time.monotonic()))
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            eventos, marcas = list(item[0]), dict(item[1])
+            limite = time.monotonic() + LOTE_MAX_ESPERA_S
+            while True:
+                while len(eventos) < LOTE_MAX_EVENTOS:
+                    try:
+                        item = self.fila.get(timeout=max(0.0, limite - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        ativo = False
+                        break
+                    self._juntar(eventos, marcas, item)
+                if espera and ativo:
+                    # Em backoff com o lote já cheio: aguarda o resto do intervalo
+                    time.sleep(max(0.0, limite - time.monotonic()))
+                try:
+                    db.salvar_lote(eventos, marcas)
+                    espera = 0.0
+                    break
+                except sqlite3.OperationalError as e:
+                    # Ex.: "database is locked" com um backfill/manutenção segurando o
+                    # lock além do busy_timeout. As marcas d'água da coleta já
+                    # avançaram, então o lote não volta sozinho: fica retido e é
+                    # regravado com backoff, somando o que chegar no meio tempo
+                    espera = min(max(espera * 2, ESPERA_RETENTATIVA_BD_S), ESPERA_RETENTATIVA_BD_MAX_S)
+                    print(f"Erro BD ({len(eventos)} evento(s)), nova tentativa em {espera:.0f}s: {e}")
+                    if not ativo:
+                        break
+                    limite = time.monotonic() + espera
+                except Exception as e:
+                    print(f"Erro BD ({len(eventos)} evento(s)): {e}")
+                    espera = 0.0
+                    break
+        db.conn.close()
+
+    @staticmethod
+    def _juntar(eventos, marcas, item):
+        eventos.extend(item[0])
+        for cat, (ts, atualizado) in item[1].items():
+            ts0, at0 = marcas.get(cat, (0, 0))
+            marcas[cat] = (max(ts0, ts), max(at0, atualizado))
+
+# --- CONSULTAS (SOMENTE LEITURA) ---
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    # Distância de grande círculo (haversine)
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class LeitorDB:
+    # Colunas devolvidas pelas buscas espaciais (nessa ordem)
+    COLUNAS_GEO = ("id", "uid", "ts", "categoria", "mag", "profundidade_km", "tipo_orig", "loc", "lat", "lon", "escala_tecnica")
+
+    def __init__(self, caminho=DB_PATH):
+        self.conn = conectar_leitura(caminho)
+        self.conn.create_function("distancia_km", 4, distancia_km, deterministic=True)
+        self.particoes = Particoes(self.conn, caminho, somente_leitura=True)
+
+    def consultar(self, sql, params=(), inicio=None, fim=None):
+        # sql com {s}.eventos, executado só nos shards que cobrem [inicio, fim)
+        return list(self.particoes.consultar(sql, params, inicio, fim))
+
+    def buscar_historico(self, cat, data):
+        # Eventos do dia (data do evento, não da gravação); só as colunas
+        # exibidas, todas presentes em idx_eventos_historico
+        inicio, fim = intervalo_dia(data)
+        return self.consultar(
+            "SELECT ts, loc, escala_tecnica FROM {s}.eventos WHERE categoria = ? AND ts >= ? AND ts < ? ORDER BY ts DESC",
+            (CATEGORIAS[cat], inicio, fim), inicio, fim)
+
+    def agregar(self, inicio=None, fim=None, categoria=None):
+        # Contagens por dia/categoria/célula/faixa de magnitude (colunas de
+        # SQL_AGREGADO) no intervalo, em granularidade de dia. Dias consolidados
+        # vêm de rollup_diario; os demais são agregados na hora a partir dos
+        # shards (só os do intervalo). O resultado não depende da retenção
+        dia_ini = None if inicio is None else inicio // MS_DIA
+        dia_fim = None if fim is None else -(-fim // MS_DIA)
+        filtro_cat = "AND categoria = ?" if categoria else ""
+        params_cat = [CATEGORIAS[categoria]] if categoria else []
+        linhas = self.conn.execute(f"""
+            SELECT dia, categoria, celula, faixa_mag, eventos, mag_max FROM rollup_diario
+            WHERE (? IS NULL OR dia >= ?) AND (? IS NULL OR dia < ?) {filtro_cat}
+        """, [dia_ini, dia_ini, dia_fim, dia_fim] + params_cat).fetchall()
+        a = None if dia_ini is None else dia_ini * MS_DIA
+        b = None if dia_fim is None else dia_fim * MS_DIA
+        for mes, de, ate in self.sem_rollup(a, b):
+            sql = SQL_AGREGADO.format(s=self.particoes.anexar(mes), filtro=filtro_cat)
+            linhas += self.conn.execute(sql, [de, ate] + params_cat).fetchall()
+        return linhas
+
+    def sem_rollup(self, a=None, b=None):
+        # (mes, de, ate): trechos de [a, b) ainda não consolidados em rollup_diario
+        trechos = []
+        for mes, de, ate in self.conn.execute("""
+            SELECT mes, IFNULL(consolidado_ate, inicio), fim FROM particoes
+            WHERE IFNULL(consolidado_ate, inicio) < fim
+              AND (? IS NULL OR fim > ?) AND (? IS NULL OR inicio < ?)
+            ORDER BY mes DESC
+        """, (a, a, b, b)).fetchall():
+            de, ate = max(de, a if a is not None else de), min(ate, b if b is not None else ate)
+            if de < ate:
+                trechos.append((mes, de, ate))
+        return trechos
+
+    def resumo_cubo(self, inicio=None, fim=None):
+        # (categoria, regiao, faixa_mag, eventos, mag_soma) somados no intervalo,
+        # em granularidade de dia; custo proporcional às células, não aos eventos
+        dia_ini = None if inicio is None else inicio // MS_DIA
+        dia_fim = None if fim is None else -(-fim // MS_DIA)
+        return self.conn.execute("""
+            SELECT categoria, regiao, faixa_mag, SUM(eventos), SUM(mag_soma) FROM cubo
+            WHERE (? IS NULL OR dia >= ?) AND (? IS NULL OR dia < ?)
+            GROUP BY 1, 2, 3
+            HAVING SUM(eventos) > 0
+        """, (dia_ini, dia_ini, dia_fim, dia_fim)).fetchall()
+
+    def buscar_detalhes(self, chaves):
+        # Texto exibido de eventos já carregados, por (ts, id): o id só é único
+        # dentro do shard, que sai do ts. Devolve {(ts, id): (tipo_orig, loc, escala_tecnica)}
+        por_mes = defaultdict(list)
+        for ts, id_ in chaves:
+            por_mes[mes_de(ts)].append(id_)
+        detalhes = {}
+        for mes, ids in por_mes.items():
+            esquema = self.particoes.anexar(mes)
+            for i in range(0, len(ids), 900):
+                parte = ids[i:i + 900]
+                for ts, id_, *texto in self.conn.execute(
+                        f"SELECT ts, id, tipo_orig, loc, escala_tecnica FROM {esquema}.eventos "
+                        f"WHERE id IN ({','.join('?' * len(parte))})", parte):
+                    detalhes[(ts, id_)] = tuple(texto)
+        return detalhes
+
+    def carregar_marcas(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT categoria, ts, atualizado FROM marcas_agua")
+        return {cat: (ts, atualizado) for cat, ts, atualizado in cursor.fetchall()}
+
+    def _buscar_geo(self, caixas, categoria=None, limite=None, inicio=None, fim=None, centro=None):
+        # Uma busca no R*Tree por caixa (duas quando a caixa cruza o antimeridiano).
+        # O R*Tree guarda float32 arredondado para fora; a comparação exata é feita
+        # em eventos. centro = (lat, lon, raio_km) filtra e ordena pela distância
+        colunas = ", ".join(f"e.{c}" for c in self.COLUNAS_GEO)
+        partes, params = [], []
+        for lat_min, lat_max, lon_min, lon_max in caixas:
+            partes.append(f"""
+                SELECT {colunas} FROM {{s}}.eventos_geo g JOIN {{s}}.eventos e ON e.id = g.id
+                WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+                  AND e.lat BETWEEN ? AND ? AND e.lon BETWEEN ? AND ?
+                  {"AND e.categoria = ?" if categoria else ""}
+                  {"AND e.ts >= ?" if inicio is not None else ""} {"AND e.ts < ?" if fim is not None else ""}
+                  {"AND distancia_km(?, ?, e.lat, e.lon) <= ?" if centro else ""}""")
+            params += [lat_min, lat_max, lon_min, lon_max] * 2
+            params += [CATEGORIAS[categoria]] if categoria else []
+            params += [x for x in (inicio, fim) if x is not None]
+            params += list(centro) if centro else []
+        ordem = "distancia_km(?, ?, lat, lon)" if centro else "ts DESC"
+        params += list(centro[:2]) if centro else []
+        sql = f"SELECT * FROM ({' UNION ALL '.join(partes)}) ORDER BY {ordem} LIMIT ?"
+        # Cada shard devolve os seus "limite" melhores; a ordem por distância é
+        # refeita sobre a junção (a por ts já sai em ordem, mês a mês)
+        linhas = self.consultar(sql, params + [-1 if limite is None else limite], inicio, fim)
+        if centro:
+            i_lat, i_lon = self.COLUNAS_GEO.index("lat"), self.COLUNAS_GEO.index("lon")
+            linhas.sort(key=lambda r: distancia_km(centro[0], centro[1], r[i_lat], r[i_lon]))
+        return linhas if limite is None else linhas[:limite]
+
+    @staticmethod
+    def _caixas(lat_min, lat_max, lon_min, lon_max):
+        # lon_min > lon_max indica uma caixa que atravessa 180°
+        if lon_min > lon_max:
+            return [(lat_min, lat_max, lon_min, 180.0), (lat_min, lat_max, -180.0, lon_max)]
+        return [(lat_min, lat_max, lon_min, lon_max)]
+
+    def buscar_bbox(self, lat_min, lat_max, lon_min, lon_max, categoria=None, limite=None, inicio=None, fim=None):
+        return self._buscar_geo(self._caixas(lat_min, lat_max, lon_min, lon_max), categoria, limite, inicio, fim)
+
+    def buscar_raio(self, lat, lon, raio_km, categoria=None, limite=None, inicio=None, fim=None):
+        # Pré-filtro pela caixa que contém o círculo, refinado pela distância
+        # real; resultado do mais próximo para o mais distante
+        dlat = math.degrees(raio_km / RAIO_TERRA_KM)
+        lat_min, lat_max = lat - dlat, lat + dlat
+        if lat_min <= -90 or lat_max >= 90:
+            # Círculo contém um polo: qualquer longitude serve
+            caixas = [(max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0)]
+        else:
+            dlon = math.degrees(math.asin(min(1.0, math.sin(raio_km / RAIO_TERRA_KM) / math.cos(math.radians(lat)))))
+            lon_min, lon_max = lon - dlon, lon + dlon
+            if lon_min < -180: lon_min += 360
+            if lon_max > 180: lon_max -= 360
+            caixas = self._caixas(lat_min, lat_max, lon_min, lon_max)
+        return self._buscar_geo(caixas, categoria, limite, inicio, fim, centro=(lat, lon, raio_km))
@@ -0,0 +1,130 @@
+"""Benchmark das consultas do histórico em um banco sintético grande.
+
+Gera (ou reaproveita) um banco com --linhas eventos distribuídos em --meses
+partições mensais e mede buscar_historico (diálogo de histórico, por
+categoria e dia) e buscar_detalhes (texto do analisador, por (ts, id)).
+
+    python benchmarks/historico.py --linhas 10000000
+    python benchmarks/historico.py --reutilizar        # só as consultas
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from banco import DBManager, LeitorDB, CATEGORIAS, NIVEIS, RISCOS, MS_DIA, limites_mes
+
+CAMINHO_PADRAO = os.path.join("bench", "historico_bench.db")
+# Proporção aproximada do feed real: sismos dominam
+PESOS_CATEGORIA = {"sismo": 70, "tsunami": 2, "vulcao": 3, "solar": 10, "clima": 15}
+PAISES = ("Chile", "Japan", "Indonesia", "Peru", "Alaska", "Mexico", "Brazil", "Turkey", "Italy", "Tonga")
+LOTE_CARGA = 100000
+
+def meses_ate(fim, n):
+    ano, mes = fim
+    for _ in range(n):
+        yield f"{ano:04d}-{mes:02d}"
+        ano, mes = (ano, mes - 1) if mes > 1 else (ano - 1, 12)
+
+def gerar(caminho, linhas, meses, semente):
+    # Carga direta nos shards (sem cubo nem rollups, que não entram nas
+    # consultas medidas); os índices são criados depois da carga, como num
+    # banco já existente que recebe o sincronizar_indices
+    rnd = random.Random(semente)
+    cats = list(PESOS_CATEGORIA)
+    pesos = list(PESOS_CATEGORIA.values())
+    niveis, riscos = list(NIVEIS.values()), list(RISCOS.values())
+    db = DBManager(caminho)
+    lista = sorted(meses_ate((2024, 12), meses))
+    por_mes = linhas // len(lista)
+    t0 = time.perf_counter()
+    for n_mes, mes in enumerate(lista):
+        esquema = db.particao(mes)
+        for nome in DBManager.INDICES:
+            db.conn.execute(f"DROP INDEX IF EXISTS {esquema}.{nome}")
+        inicio, fim = limites_mes(mes)
+        base = n_mes * por_mes
+        for a in range(0, por_mes, LOTE_CARGA):
+            lote = []
+            for i in range(base + a, base + min(a + LOTE_CARGA, por_mes)):
+                ts = rnd.randrange(inicio, fim)
+                cat = rnd.choices(cats, pesos)[0]
+                mag = round(rnd.uniform(0.5, 7.5), 1)
+                lote.append((f"bench:{i}", ts, ts, CATEGORIAS[cat], mag, round(rnd.uniform(0, 300), 1),
+                             rnd.uniform(-60, 60), rnd.uniform(-180, 180), rnd.choice(niveis), rnd.choice(riscos),
+                             f"{cat.upper()} - {mag}", f"{rnd.randrange(200)} km N of X, {rnd.choice(PAISES)}",
+                             f"Richter {mag}", "Terrestre / Estrutural"))
+            with db.conn:
+                db.conn.executemany(f"""
+                    INSERT INTO {esquema}.eventos
+                    (uid, ts, atualizado, categoria, mag, profundidade_km, lat, lon,
+                     nivel_impacto, risco_vitimas, tipo_orig, loc, escala_tecnica, tipo_impacto)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, lote)
+        db.sincronizar_indices(esquema)
+        print(f"  {mes}: {por_mes} linha(s) ({time.perf_counter() - t0:.0f}s)")
+    db.conn.close()
+
+def medir(rotulo, consultas, funcao):
+    tempos = []
+    for args in consultas:
+        t = time.perf_counter()
+        resultado = funcao(*args)
+        tempos.append((time.perf_counter() - t) * 1000)
+    tempos.sort()
+    print(f"{rotulo}: mediana {statistics.median(tempos):.2f} ms, "
+          f"p95 {tempos[int(len(tempos) * 0.95) - 1]:.2f} ms, máx {tempos[-1]:.2f} ms "
+          f"({len(consultas)} consultas, última com {len(resultado)} linha(s))")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--caminho", default=CAMINHO_PADRAO)
+    parser.add_argument("--linhas", type=int, default=10_000_000)
+    parser.add_argument("--meses", type=int, default=24)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--reutilizar", action="store_true", help="não gera o banco, só mede")
+    args = parser.parse_args()
+
+    if not args.reutilizar:
+        if os.path.exists(args.caminho):
+            sys.exit(f"{args.caminho} já existe: apague-o ou use --reutilizar")
+        os.makedirs(os.path.dirname(os.path.abspath(args.caminho)), exist_ok=True)
+        print(f"Gerando {args.linhas} evento(s) em {args.meses} partição(ões)...")
+        gerar(args.caminho, args.linhas, args.meses, args.semente)
+
+    leitor = LeitorDB(args.caminho)
+    meses = leitor.particoes.meses()
+    total = sum(leitor.conn.execute(f"SELECT MAX(id) FROM {leitor.particoes.anexar(m)}.eventos").fetchone()[0] or 0
+                for m in meses)
+    print(f"Banco: {len(meses)} partição(ões), ~{total} evento(s)")
+    rnd = random.Random(args.semente)
+
+    # Histórico: categoria e dia sorteados dentro do período gerado
+    inicio = leitor.conn.execute("SELECT MIN(inicio) FROM particoes").fetchone()[0]
+    fim = leitor.conn.execute("SELECT MAX(fim) FROM particoes").fetchone()[0]
+    dias = [datetime.fromtimestamp(rnd.randrange(inicio, fim - MS_DIA) / 1000).strftime("%Y-%m-%d")
+            for _ in range(args.consultas)]
+    consultas = [(rnd.choice(list(PESOS_CATEGORIA)), d) for d in dias]
+    print(leitor.conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT ts, loc, escala_tecnica FROM {leitor.particoes.anexar(meses[0])}.eventos "
+        "WHERE categoria = ? AND ts >= ? AND ts < ? ORDER BY ts DESC", (1, 0, 1)).fetchall())
+    medir("buscar_historico", consultas, leitor.buscar_historico)
+
+    # Detalhes: lotes de 500 chaves (ts, id) de um mesmo período, como os do analisador
+    lotes = []
+    for _ in range(args.consultas):
+        esquema = leitor.particoes.anexar(rnd.choice(meses))
+        maximo = leitor.conn.execute(f"SELECT MAX(id) FROM {esquema}.eventos").fetchone()[0]
+        ids = [rnd.randrange(1, maximo + 1) for _ in range(500)]
+        chaves = leitor.conn.execute(f"SELECT ts, id FROM {esquema}.eventos WHERE id IN ({','.join('?' * len(ids))})",
+                                     ids).fetchall()
+        lotes.append((chaves,))
+    medir("buscar_detalhes (500 chaves)", lotes, leitor.buscar_detalhes)
+
+if __name__ == "__main__":
+    main()
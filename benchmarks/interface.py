@@ -0,0 +1,102 @@
+"""Benchmark da troca de estado dos tiles do menu (hover e piscar).
+
+Mede o TileMenu atual (propriedades dinâmicas + ESTILO_APP aplicado uma vez)
+contra a versão anterior, que refazia o setStyleSheet do tile e dos rótulos a
+cada troca (reproduzida abaixo em TileAntigo). Só a troca de estado é medida
+(enter+leave ou uma fase do pisca), sem a pintura.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/interface.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from PyQt5.QtWidgets import QApplication, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton
+from PyQt5.QtCore import Qt, QEvent
+from GeoEventViewer import TileMenu, ESTILO_APP, CORES_CATEGORIA
+
+class TileAntigo(QPushButton):
+    # TileMenu antes do ESTILO_APP: stylesheet próprio refeito a cada hover
+    def __init__(self, titulo, tipo, cor):
+        super().__init__()
+        self.setFixedSize(200, 110)
+        self.tipo, self.cor = tipo, cor
+        self.installEventFilter(self)
+        l = QVBoxLayout(self)
+        self.lbl_t = QLabel(titulo)
+        self.lbl_t.setStyleSheet("font-weight: bold; font-size: 10pt; color: white; background: transparent;")
+        self.lbl_info = QLabel("Aguardando dados...")
+        self.lbl_info.setStyleSheet("font-size: 7pt; color: #abb2bf; background: transparent;")
+        l.addWidget(self.lbl_t, 0, Qt.AlignCenter); l.addWidget(self.lbl_info, 0, Qt.AlignCenter)
+        self.set_default_style()
+
+    def set_default_style(self):
+        self.setStyleSheet(f"QPushButton {{ background-color: #282c34; border-bottom: 4px solid {self.cor}; border-radius: 8px; }} "
+                           "QPushButton[piscando=\"true\"] { background-color: #323842; }")
+
+    def piscar(self, ligado):
+        if self.property("piscando") != ligado:
+            self.setProperty("piscando", ligado)
+            self.style().unpolish(self)
+            self.style().polish(self)
+
+    def set_hover_style(self):
+        self.setStyleSheet(f"QPushButton {{ background-color: {self.cor}; border-bottom: 4px solid {self.cor}; border-radius: 8px; }}")
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Enter:
+            self.set_hover_style()
+            self.lbl_t.setStyleSheet("color: black; font-weight: bold; background: transparent;")
+            self.lbl_info.setStyleSheet("color: #282c34; background: transparent;")
+        elif event.type() == QEvent.Leave:
+            self.set_default_style()
+            self.lbl_t.setStyleSheet("color: white; font-weight: bold; background: transparent;")
+            self.lbl_info.setStyleSheet("color: #abb2bf; background: transparent;")
+        return super().eventFilter(obj, event)
+
+def montar(classe):
+    # Uma linha de tiles, como no menu principal
+    janela = QWidget()
+    l = QHBoxLayout(janela)
+    tiles = [classe(tipo.upper(), tipo, cor) for tipo, cor in CORES_CATEGORIA.items()]
+    for t in tiles:
+        l.addWidget(t)
+    janela.show()
+    QApplication.processEvents()
+    return janela, tiles
+
+def medir(rotulo, repeticoes, acao):
+    tempos = []
+    for i in range(repeticoes):
+        t = time.perf_counter()
+        acao(i)
+        tempos.append((time.perf_counter() - t) * 1000)
+    tempos.sort()
+    print(f"  {rotulo}: mediana {statistics.median(tempos):.3f} ms, "
+          f"p95 {tempos[int(len(tempos) * 0.95) - 1]:.3f} ms ({repeticoes} trocas)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    for rotulo, classe, estilo in (("anterior (setStyleSheet por estado)", TileAntigo, ""),
+                                   ("atual (ESTILO_APP + propriedades)", TileMenu, ESTILO_APP)):
+        app.setStyleSheet(estilo)
+        janela, tiles = montar(classe)
+        print(rotulo)
+
+        def hover(i):
+            t = tiles[i % len(tiles)]
+            QApplication.sendEvent(t, QEvent(QEvent.Enter))
+            QApplication.sendEvent(t, QEvent(QEvent.Leave))
+        medir("hover enter+leave", args.repeticoes, hover)
+        medir("piscar", args.repeticoes, lambda i: tiles[i % len(tiles)].piscar(i // len(tiles) % 2 == 0))
+        janela.close()
+
+if __name__ == "__main__":
+    main()